@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+asyncio HTTP front end for the WSGI applications in server_2d.py and
+server_nd.py (standard library only).
+
+The event loop only reads requests and writes responses; every call into the
+application runs in a thread pool executor.  A slow request (building a large
+N-d board, a huge flood fill) therefore ties up one worker thread instead of
+stalling every other client's renders and digs.
+"""
+
+import io
+import sys
+import asyncio
+import traceback
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_HEADER_LINES = 100
+
+
+def run_application(application, environ):
+    """
+    Calls a WSGI application and returns its (status, headers, body).
+    """
+    response = []
+
+    def start_response(status, headers, exc_info=None):
+        response[:] = [status, headers]
+
+    result = application(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return response[0], response[1], body
+
+
+def make_environ(method, target, version, headers, body, server_address):
+    """
+    Returns the WSGI environ dictionary of a request.
+    """
+    path, _, query = target.partition("?")
+    environ = {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": urllib.parse.unquote(path, "latin-1"),
+        "QUERY_STRING": query,
+        "CONTENT_TYPE": headers.pop("content-type", ""),
+        "CONTENT_LENGTH": headers.pop("content-length", ""),
+        "SERVER_NAME": str(server_address[0]),
+        "SERVER_PORT": str(server_address[1]),
+        "SERVER_PROTOCOL": version,
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in headers.items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    return environ
+
+
+async def read_request(reader):
+    """
+    Reads one request from the stream.  Returns (method, target, version,
+    headers, body), or None if the client closed the connection.  Raises
+    ValueError on malformed requests.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, version = request_line.decode("latin-1").split()
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError("too many headers")
+
+    length = int(headers.get("content-length") or 0)
+    body = await reader.readexactly(length) if length else b""
+    return method, target, version, headers, body
+
+
+def format_response(status, headers, body, keep_alive):
+    """
+    Returns the bytes of an HTTP/1.1 response.
+    """
+    lines = [f"HTTP/1.1 {status}"]
+    names = set()
+    for name, value in headers:
+        lines.append(f"{name}: {value}")
+        names.add(name.lower())
+    if "content-length" not in names:
+        lines.append(f"Content-Length: {len(body)}")
+    lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def handle_connection(reader, writer, application, executor):
+    """
+    Serves the requests of one client connection, one at a time, until the
+    client closes it or asks not to keep it alive.
+    """
+    loop = asyncio.get_running_loop()
+    server_address = writer.get_extra_info("sockname") or ("", 0)
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(
+                    format_response("400 BAD REQUEST", [], b"bad request", False)
+                )
+                break
+            if request is None:
+                break
+            method, target, version, headers, body = request
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" and (
+                version == "HTTP/1.1" or connection == "keep-alive"
+            )
+
+            environ = make_environ(
+                method, target, version, headers, body, server_address
+            )
+            try:
+                status, response_headers, response_body = await loop.run_in_executor(
+                    executor, run_application, application, environ
+                )
+            except Exception:
+                # answer like wsgiref's server: log the traceback, send a 500
+                traceback.print_exc(file=sys.stderr)
+                writer.write(
+                    format_response(
+                        "500 INTERNAL SERVER ERROR", [], b"internal server error", False
+                    )
+                )
+                break
+            if method == "HEAD":
+                response_body = b""
+            writer.write(
+                format_response(status, response_headers, response_body, keep_alive)
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(application, host="", port=6101, executor=None):
+    """
+    Starts serving the WSGI application and returns the asyncio server.
+    Application calls run in executor (a new thread pool if None).
+    """
+    if executor is None:
+        executor = ThreadPoolExecutor()
+
+    def on_connection(reader, writer):
+        return handle_connection(reader, writer, application, executor)
+
+    return await asyncio.start_server(on_connection, host or None, port)
+
+
+def serve(application, host="", port=6101, workers=None):
+    """
+    Serves the WSGI application forever, running application calls on a
+    pool of the given number of worker threads.
+    """
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            server = await start_server(application, host, port, executor)
+            async with server:
+                await server.serve_forever()
+
+    asyncio.run(main())
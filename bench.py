@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the game engine in main.py.
+
+Times new_game_nd, dig_nd (one numbered cell, and the flood fill of an
+opening), render_nd and victory_check on random boards over a matrix of
+dimensionality, board volume and bomb density, measuring every operation's
+best time over a number of repeats and, in a separate run under tracemalloc,
+its peak memory.  Results are written as JSON; given a baseline file written
+by an earlier run, the cases that got slower than it by more than a threshold
+are reported and the command exits with status 1.
+
+    python3 bench.py --dimensions 2 3 4 --volumes 1000 10000 -o results.json
+    python3 bench.py --baseline results.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+import main
+
+OPERATIONS = ("new_game_nd", "dig_cell", "dig_opening", "render_nd", "victory_check")
+
+# slowdowns smaller than this many seconds are noise, whatever their ratio
+MIN_SLOWDOWN = 1e-4
+
+
+def board_shape(dimensions, volume):
+    """
+    Returns the shape of the board with the given number of dimensions, all
+    of the same length, whose volume is closest to the given volume.
+
+    >>> board_shape(2, 10000), board_shape(3, 1000), board_shape(8, 1000)
+    ((100, 100), (10, 10, 10), (2, 2, 2, 2, 2, 2, 2, 2))
+    """
+    side = max(2, round(volume ** (1 / dimensions)))
+    return (side,) * dimensions
+
+
+def random_bombs(shape, density, rng):
+    """
+    Returns the coordinates of distinct random bombs covering the given
+    fraction of a board.
+
+    >>> len(random_bombs((10, 10), 0.15, random.Random(0)))
+    15
+    """
+    size = main.strides_of(shape)[0] * shape[0]
+    return [
+        main.flat_coordinates(index, shape)
+        for index in rng.sample(range(size), int(density * size))
+    ]
+
+
+def find_cell(game, wanted):
+    """
+    Returns the coordinates of the first cell of a flat game for which
+    wanted(count) is true, or None.
+    """
+    for index, count in enumerate(game["cells"]):
+        if wanted(count):
+            return main.flat_coordinates(index, game["dimensions"])
+    return None
+
+
+def operation_calls(shape, bombs):
+    """
+    Returns a dictionary mapping the name of every operation that applies to
+    a board to a pair (setup, run): setup() builds what run(state) times.
+    """
+    def new_game():
+        return main.new_game_nd(shape, bombs, legacy=False)
+
+    calls = {"new_game_nd": (lambda: None, lambda _: new_game())}
+
+    sample = new_game()
+    numbered = find_cell(sample, lambda count: count > 0)
+    opening = find_cell(sample, lambda count: count == 0)
+    if numbered is not None:
+        calls["dig_cell"] = (new_game, lambda game: main.dig_nd(game, numbered))
+    if opening is not None:
+        calls["dig_opening"] = (new_game, lambda game: main.dig_nd(game, opening))
+
+    def dug_game():
+        game = new_game()
+        if opening is not None:
+            main.dig_nd(game, opening)
+        return game
+
+    calls["render_nd"] = (dug_game, main.render_nd)
+    calls["victory_check"] = (dug_game, main.victory_check)
+    return calls
+
+
+def measure(setup, run, repeats):
+    """
+    Returns (best time in seconds, peak memory in bytes) of run(setup())
+    over the given number of repeats, the memory being measured in one more
+    run, under tracemalloc.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(dimensions, volumes, densities, repeats=3, seed=0, log=None):
+    """
+    Runs every operation over the matrix of dimensions, volumes and densities
+    and returns the list of results, one dictionary per case.  Progress lines
+    go to log, if given.
+    """
+    results = []
+    for ndim in dimensions:
+        for volume in volumes:
+            shape = board_shape(ndim, volume)
+            for density in densities:
+                bombs = random_bombs(shape, density, random.Random(seed))
+                calls = operation_calls(shape, bombs)
+                for operation in OPERATIONS:
+                    if operation not in calls:
+                        continue
+                    seconds, peak = measure(*calls[operation], repeats)
+                    result = {
+                        "operation": operation,
+                        "dimensions": ndim,
+                        "shape": list(shape),
+                        "volume": main.strides_of(shape)[0] * shape[0],
+                        "density": density,
+                        "bombs": len(bombs),
+                        "seconds": seconds,
+                        "peak_bytes": peak,
+                    }
+                    results.append(result)
+                    if log is not None:
+                        print(format_result(result), file=log, flush=True)
+    return results
+
+
+def case_key(result):
+    """
+    Returns what identifies the case of a result across runs.
+    """
+    return (result["operation"], tuple(result["shape"]), result["density"])
+
+
+def format_result(result):
+    """
+    Returns a one-line description of a result.
+
+    >>> print(format_result({'operation': 'render_nd', 'shape': [10, 10],
+    ...                      'density': 0.1, 'seconds': 0.00125,
+    ...                      'peak_bytes': 20480}))
+    render_nd       10x10           density 0.1        1.250 ms      20.0 KiB
+    """
+    return "%-15s %-15s density %-6g %9.3f ms %9.1f KiB" % (
+        result["operation"],
+        "x".join(map(str, result["shape"])),
+        result["density"],
+        result["seconds"] * 1000,
+        result["peak_bytes"] / 1024,
+    )
+
+
+def regressions(results, baseline, threshold=1.25):
+    """
+    Returns the (result, baseline result) pairs of the cases that take more
+    than threshold times as long as in the baseline (and at least
+    MIN_SLOWDOWN seconds longer).  Cases missing from either are ignored.
+
+    >>> old = [{'operation': 'render_nd', 'shape': [4, 4], 'density': 0.1,
+    ...         'seconds': 0.01}]
+    >>> new = [dict(old[0], seconds=0.02), dict(old[0], density=0.2)]
+    >>> [(r['seconds'], b['seconds']) for r, b in regressions(new, old)]
+    [(0.02, 0.01)]
+    >>> regressions(new, old, threshold=2.5)
+    []
+    """
+    previous = {case_key(result): result for result in baseline}
+    found = []
+    for result in results:
+        before = previous.get(case_key(result))
+        if before is None:
+            continue
+        if (
+            result["seconds"] > threshold * before["seconds"]
+            and result["seconds"] - before["seconds"] > MIN_SLOWDOWN
+        ):
+            found.append((result, before))
+    return found
+
+
+def parse_args(argv):
+    """
+    Parses the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--dimensions", type=int, nargs="+", default=list(range(2, 9)),
+        help="numbers of dimensions (default: 2 to 8)",
+    )
+    parser.add_argument(
+        "--volumes", type=int, nargs="+", default=[1000, 10000],
+        help="approximate numbers of cells per board (default: 1000 10000)",
+    )
+    parser.add_argument(
+        "--densities", type=float, nargs="+", default=[0.01, 0.1, 0.2],
+        help="fractions of cells holding bombs (default: 0.01 0.1 0.2)",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3,
+        help="runs per case, the best of which is kept (default: 3)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the boards")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to")
+    parser.add_argument(
+        "--baseline", help="JSON results of an earlier run to compare against"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=1.25,
+        help="slowdown ratio reported as a regression (default: 1.25)",
+    )
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    """
+    Runs the benchmarks from the command line and returns the exit status.
+    """
+    args = parse_args(argv)
+    results = run_benchmarks(
+        args.dimensions, args.volumes, args.densities, args.repeats, args.seed,
+        log=sys.stderr,
+    )
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "repeats": args.repeats,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        slower = regressions(results, baseline, args.threshold)
+        for result, before in slower:
+            print(
+                "REGRESSION %s (%.2fx, was %.3f ms)"
+                % (
+                    format_result(result),
+                    result["seconds"] / before["seconds"],
+                    before["seconds"] * 1000,
+                ),
+                file=sys.stderr,
+            )
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Compact binary file format for games.
+
+A game file holds a fixed header followed by the game's cells, packed:
+
+    offset  size      field
+    0       4         magic, b"MSWG"
+    4       2         format version (FORMAT_VERSION)
+    6       2         number of dimensions, n
+    8       2         field bits (see the FIELD_* constants)
+    10      1         bytes per neighbor count (1, 2 or 4)
+    11      1         state, as an index into STATES
+    12      8         hidden_safe
+    20      8         version
+    28      8         flag_count
+    36      8 * n     dimensions
+            ...       zero padding up to a multiple of 8 bytes
+            w * size  neighbor counts, signed, -1 for bombs (row-major)
+            ...       zero padding up to a multiple of 8 bytes
+            size / 8  hidden bitplane, one bit per cell, lowest bit first
+            size / 8  flag bitplane (only with FIELD_FLAGS)
+
+All numbers are little-endian.  Any form of game can be saved; legacy games
+(nested 'board' and 'hidden' lists) load back as legacy games and every other
+form as a flat main.Game, equal to the flat form of what was saved.
+
+GameFile opens a saved game through mmap without reading it: its game
+attribute is a read-only flat game whose planes are views of the file, so
+render_slice and render_rows only touch the pages of the cells they render.
+"""
+
+import sys
+import mmap
+import array
+import struct
+
+import main
+from move_log import pack_mask, unpack_mask
+
+MAGIC = b"MSWG"
+FORMAT_VERSION = 1
+STATES = ("ongoing", "victory", "defeat")
+
+HEADER = struct.Struct("<4sHHHBBQQQ")
+
+# which optional fields the saved game had
+FIELD_HIDDEN_SAFE = 1
+FIELD_VERSION = 2
+FIELD_FLAGS = 4
+FIELD_LEGACY = 8
+FIELD_DIMENSIONS_LIST = 16
+
+# array typecodes of signed 1, 2 and 4 byte integers
+COUNT_TYPES = {1: "b", 2: "h", 4: "i"}
+
+
+def padded(offset):
+    """
+    Returns offset rounded up to a multiple of 8.
+
+    >>> padded(36), padded(48)
+    (40, 48)
+    """
+    return -(-offset // 8) * 8
+
+
+def count_width(cells):
+    """
+    Returns the number of bytes per neighbor count needed to store cells.
+
+    >>> count_width([-1, 0, 80]), count_width([-1, 242]), count_width([70000])
+    (1, 2, 4)
+    """
+    largest = max(cells, default=0)
+    for width in (1, 2):
+        if largest < 1 << (8 * width - 1):
+            return width
+    return 4
+
+
+def dump_game(game, file):
+    """
+    Writes a game to a binary file object in the game file format.
+    """
+    legacy = "board" in game
+    flat = main.flat_game(game)
+    dimensions = flat["dimensions"]
+    fields = 0
+    hidden_safe = game.get("hidden_safe")
+    if hidden_safe is not None:
+        fields |= FIELD_HIDDEN_SAFE
+    if "version" in game:
+        fields |= FIELD_VERSION
+    if "flag_count" in flat:
+        fields |= FIELD_FLAGS
+    if legacy:
+        fields |= FIELD_LEGACY
+        if isinstance(game["dimensions"], list):
+            fields |= FIELD_DIMENSIONS_LIST
+
+    cells = flat["cells"]
+    width = count_width(cells)
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        len(dimensions),
+        fields,
+        width,
+        STATES.index(flat["state"]),
+        hidden_safe or 0,
+        game.get("version", 0),
+        flat.get("flag_count", 0),
+    ) + struct.pack("<%dQ" % len(dimensions), *dimensions)
+    file.write(header.ljust(padded(len(header)), b"\0"))
+
+    counts = array.array(COUNT_TYPES[width], cells)
+    if sys.byteorder == "big":
+        counts.byteswap()
+    file.write(counts.tobytes().ljust(padded(len(counts) * width), b"\0"))
+    file.write(pack_mask(flat["mask"]).ljust((len(cells) + 7) // 8, b"\0"))
+    if fields & FIELD_FLAGS:
+        file.write(bytes(flat["flags"]))
+
+
+def save_game(game, filename):
+    """
+    Saves a game to the named file in the game file format.
+    """
+    with open(filename, "wb") as f:
+        dump_game(game, f)
+
+
+def load_game(filename):
+    """
+    Loads the game saved in the named file, in the form it was saved in
+    (see the module docstring).
+    """
+    with GameFile(filename) as game_file:
+        return game_file.load()
+
+
+class BitPlane:
+    """
+    Read-only sequence of the bits of a bitplane buffer, as 0s and 1s, the
+    lowest bit of the first byte first.
+
+    >>> plane = BitPlane(b'\\x0d\\x01', 9)
+    >>> len(plane), plane[2], plane[1:9:2], list(plane)[-2:]
+    (9, 1, [0, 1, 0, 0], [0, 1])
+    """
+
+    def __init__(self, buffer, size):
+        self.buffer = buffer
+        self.size = size
+
+    def __len__(self):
+        """
+        Returns the number of bits of the plane.
+        """
+        return self.size
+
+    def __getitem__(self, key):
+        """
+        Returns the bit at an index, or a list of the bits of a slice.
+        """
+        buffer = self.buffer
+        if isinstance(key, slice):
+            return [
+                buffer[index >> 3] >> (index & 7) & 1
+                for index in range(*key.indices(self.size))
+            ]
+        if key < 0:
+            key += self.size
+        if not 0 <= key < self.size:
+            raise IndexError("bit index out of range")
+        return buffer[key >> 3] >> (key & 7) & 1
+
+    def __iter__(self):
+        """
+        Yields the bits of the plane in order.
+        """
+        buffer = self.buffer
+        for index in range(self.size):
+            yield buffer[index >> 3] >> (index & 7) & 1
+
+
+class GameFile:
+    """
+    A game file opened through mmap (see the module docstring).  Closing it
+    (or leaving it as a context manager) invalidates its game.
+
+    >>> import os, tempfile
+    >>> g = main.new_game_nd((2, 4, 2), [(0, 0, 1), (1, 0, 0), (1, 1, 1)],
+    ...                      legacy=False)
+    >>> main.dig_nd(g, (0, 3, 0)), main.flag_nd(g, (1, 1, 0))
+    (8, True)
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.bin')
+    >>> save_game(g, path)
+    >>> with GameFile(path) as f:
+    ...     print(f.game['dimensions'], f.game['state'], f.game['hidden_safe'])
+    ...     print(f.render_slice((1, 0, 0), 1, 2))
+    ...     print(f.load() == g)
+    (2, 4, 2) ongoing 5
+    [['_', '_'], ['F', '_'], ['1', '1'], [' ', ' ']]
+    True
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # memoryviews of the map, released before it is closed
+        self.buffers = []
+        try:
+            self.game = self.view()
+        except Exception:
+            self.close()
+            raise
+
+    def view(self):
+        """
+        Parses the header and returns the flat game viewing the file.
+        """
+        (
+            magic,
+            version,
+            ndim,
+            fields,
+            width,
+            state,
+            hidden_safe,
+            game_version,
+            flag_count,
+        ) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError("not a game file")
+        if version != FORMAT_VERSION:
+            raise ValueError("unsupported game file version %d" % version)
+        dimensions = struct.unpack_from("<%dQ" % ndim, self.map, HEADER.size)
+        strides = main.strides_of(dimensions)
+        size = strides[0] * dimensions[0] if dimensions else 0
+        self.fields = fields
+
+        self.buffers.append(memoryview(self.map))
+        offset = padded(HEADER.size + 8 * ndim)
+        cells = self.buffers[0][offset : offset + size * width]
+        if sys.byteorder == "big":
+            counts = array.array(COUNT_TYPES[width], cells)
+            counts.byteswap()
+            cells.release()
+            cells = counts
+        else:
+            cells = cells.cast(COUNT_TYPES[width])
+            self.buffers.append(cells)
+        offset += padded(size * width)
+        plane_size = (size + 7) // 8
+        mask = self.buffers[0][offset : offset + plane_size]
+        self.buffers.append(mask)
+
+        game = main.Game(
+            dimensions=dimensions,
+            strides=strides,
+            cells=cells,
+            mask=BitPlane(mask, size),
+            state=STATES[state],
+        )
+        if fields & FIELD_HIDDEN_SAFE:
+            game["hidden_safe"] = hidden_safe
+        if fields & FIELD_VERSION:
+            game["version"] = game_version
+        if fields & FIELD_FLAGS:
+            offset += plane_size
+            flags = self.buffers[0][offset : offset + plane_size]
+            self.buffers.append(flags)
+            game["flags"] = flags
+            game["flag_count"] = flag_count
+        return game
+
+    def load(self):
+        """
+        Returns a copy of the saved game, in the form it was saved in, that
+        does not depend on the file.
+        """
+        view = self.game
+        size = len(view["mask"])
+        game = main.Game(
+            dimensions=view["dimensions"],
+            strides=view["strides"],
+            cells=view["cells"].tolist(),
+            mask=unpack_mask(view["mask"].buffer, size),
+            state=view["state"],
+        )
+        for key in ("hidden_safe", "version", "flag_count"):
+            if key in view:
+                game[key] = view[key]
+        if "flags" in view:
+            game["flags"] = bytearray(view["flags"])
+        if not self.fields & FIELD_LEGACY:
+            return game
+        legacy = main.legacy_game(game)
+        if self.fields & FIELD_DIMENSIONS_LIST:
+            legacy["dimensions"] = list(legacy["dimensions"])
+        for key in ("hidden_safe", "version"):
+            if key in game:
+                legacy[key] = game[key]
+        return legacy
+
+    def render_slice(self, coordinates, row_axis, col_axis, xray=False, window=None):
+        """
+        Renders a 2-D slice of the saved game (see main.render_slice).
+        """
+        return main.render_slice(
+            self.game, coordinates, row_axis, col_axis, xray, window
+        )
+
+    def close(self):
+        """
+        Releases the views of the file and unmaps it.
+        """
+        for buffer in reversed(self.buffers):
+            buffer.release()
+        self.buffers = []
+        self.map.close()
+
+    def __enter__(self):
+        """
+        Returns the opened file.
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Closes the file.
+        """
+        self.close()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Session-keyed registry of the games served by server_2d.py and server_nd.py.
+
+Every game gets an id when it is added; requests name the game they act on
+by that id.  Each game has its own lock, so requests for different games run
+concurrently while requests for the same game are serialized.  Games that
+have not been used for ttl seconds, or that fall off the end of the
+least-recently-used list once there are more than max_games, are evicted,
+except while a request holds or waits for their lock.
+"""
+
+import time
+import uuid
+import threading
+import contextlib
+from collections import OrderedDict
+
+
+class GameStore:
+    """
+    Thread-safe mapping from game ids to games, with LRU/TTL eviction.
+
+    >>> store = GameStore(max_games=2)
+    >>> first = store.add({'state': 'ongoing'})
+    >>> with store.locked(first) as game:
+    ...     game['state']
+    'ongoing'
+    >>> second = store.add({'state': 'ongoing'})
+    >>> third = store.add({'state': 'victory'})
+    >>> first in store, second in store, third in store
+    (False, True, True)
+    """
+
+    def __init__(self, max_games=1000, ttl=3600, clock=time.monotonic):
+        self.max_games = max_games
+        self.ttl = ttl
+        self.clock = clock
+        # game id -> [game, lock, last use, requests holding or waiting for
+        # the lock], least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, game_id):
+        with self._lock:
+            return game_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def add(self, game, game_id=None):
+        """
+        Adds a game to the store (replacing any game with the same id) and
+        returns its id, evicting idle games to make room.
+        """
+        if game_id is None:
+            game_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[game_id] = [game, threading.Lock(), self.clock(), 0]
+            self._entries.move_to_end(game_id)
+            self._evict()
+        return game_id
+
+    def remove(self, game_id):
+        """
+        Removes a game from the store, if it is there.
+        """
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    @contextlib.contextmanager
+    def locked(self, game_id):
+        """
+        Context manager holding the lock of the game with the given id and
+        yielding the game.  Raises KeyError if there is no such game.
+        """
+        with self._lock:
+            self._evict()
+            entry = self._entries[game_id]
+            entry[2] = self.clock()
+            entry[3] += 1
+            self._entries.move_to_end(game_id)
+        try:
+            with entry[1]:
+                yield entry[0]
+        finally:
+            with self._lock:
+                entry[3] -= 1
+
+    def _evict(self):
+        """
+        Drops the games idle for longer than ttl and, past max_games, the
+        least recently used ones, skipping those in use by a request (so that
+        a game is never dropped in the middle of a move).  Must be called with
+        the store lock held.
+        """
+        deadline = self.clock() - self.ttl
+        excess = len(self._entries) - self.max_games
+        evicted = []
+        for game_id, entry in self._entries.items():
+            if entry[2] >= deadline and excess <= 0:
+                break
+            if not entry[3]:
+                evicted.append(game_id)
+                excess -= 1
+        for game_id in evicted:
+            del self._entries[game_id]
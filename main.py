@@ -1,6 +1,9 @@
 
 
 #!/usr/bin/env python3
+"""
+Minesweeper on 2-D and N-D boards.
+"""
 
 # import typing
 import doctest
@@ -24,7 +27,7 @@ def dump(game):
 # 2-D IMPLEMENTATION
 
 
-def new_game_2d(num_rows, num_cols, bombs):
+def new_game_2d(num_rows, num_cols, bombs, legacy=True):
     """
     Start a new game.
 
@@ -36,6 +39,8 @@ def new_game_2d(num_rows, num_cols, bombs):
        num_cols (int): Number of columns
        bombs (list): List of bombs, given in (row, column) pairs, which are
                      tuples
+       legacy (bool): Whether to return the game with nested lists (see
+                      new_game_nd)
 
     Returns:
        A game state dictionary
@@ -51,7 +56,7 @@ def new_game_2d(num_rows, num_cols, bombs):
     state: ongoing
     """
     dimensions = (num_rows, num_cols)
-    return new_game_nd(dimensions, bombs)
+    return new_game_nd(dimensions, bombs, legacy)
     # board = []
     # board_row = [0]*num_cols
     # for row in range(num_rows):
@@ -82,7 +87,7 @@ def new_game_2d(num_rows, num_cols, bombs):
     # }
 
 
-def dig_2d(game, row, col):
+def dig_2d(game, row, col, delta=False):
     """
     Reveal the cell at (row, col), and, in some cases, recursively reveal its
     neighboring squares.
@@ -102,9 +107,12 @@ def dig_2d(game, row, col):
        game (dict): Game state
        row (int): Where to start digging (row)
        col (int): Where to start digging (col)
+       delta (bool): Whether to return the revealed squares themselves
 
     Returns:
-       int: the number of new squares revealed
+       int: the number of new squares revealed, or, if delta is True, the
+       list of ((row, col), string) pairs of the revealed squares (see
+       dig_nd)
 
     >>> game = {'dimensions': (2, 4),
     ...         'board': [['.', 3, 1, 0],
@@ -181,7 +189,25 @@ def dig_2d(game, row, col):
     #     game["state"] = "victory"
     # return revealed
     coordinates = (row, col)
-    return dig_nd(game, coordinates)
+    return dig_nd(game, coordinates, delta)
+
+
+def flag_2d(game, row, col, flag=True):
+    """
+    Flag (or, if flag is False, unflag) the hidden square at (row, col)
+    (see flag_nd).
+
+    Parameters:
+       game (dict): Game state
+       row (int): Row of the square to flag
+       col (int): Column of the square to flag
+       flag (bool): Whether to flag or to unflag the square
+
+    >>> g = new_game_2d(1, 3, [(0, 0)])
+    >>> flag_2d(g, 0, 0), render_2d_board(g)
+    (True, 'F__')
+    """
+    return flag_nd(game, (row, col), flag)
 
 
 def render_2d_locations(game, xray=False):
@@ -273,15 +299,7 @@ def render_2d_board(game, xray=False):
     ...                            [True, True, False, True]]})
     '.31_\\n.31_\\n__1_'
     """
-    # render_nd(game, xray=False)
-    locations = render_2d_locations(game, xray)
-    # [['.', '3', '1', '_'],['_', '_', '1', '_']]
-    result = ""
-    for row in locations:
-        for element in row:
-            result += element
-        result += "\n"
-    return result[:-1]
+    return "\n".join(render_2d_lines(game, xray))
 
 
 # N-D IMPLEMENTATION HELPER
@@ -386,38 +404,1547 @@ def neighbors(coordinates, dimensions):
 
 def all_possible_coordinates(dimensions):
     """
-    Returns all possible coordinates in a given board.
-    >>> all_possible_coordinates([3])
+    Yields all possible coordinates in a given board, first axis fastest.
+    Coordinates are generated one at a time, so iterating over them takes
+    no more memory than a single coordinate.
+    >>> list(all_possible_coordinates([3]))
     [(0,), (1,), (2,)]
-    >>> all_possible_coordinates([2,3])
+    >>> list(all_possible_coordinates([2,3]))
     [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2)]
 
     """
-    if len(dimensions) == 0:
-        return [()]
+    if 0 in dimensions:
+        return
+    coordinates = [0] * len(dimensions)
+    while True:
+        yield tuple(coordinates)
+        for axis, dim in enumerate(dimensions):
+            coordinates[axis] += 1
+            if coordinates[axis] < dim:
+                break
+            coordinates[axis] = 0
+        else:
+            return
+
+
+# FLAT BOARD ENGINE
+#
+# Games built by new_game_nd(..., legacy=False) keep their board in flat,
+# row-major buffers instead of nested lists:
+#
+#    'cells'   list of neighbor counts, one per cell (BOMB for bombs)
+#    'mask'    bytearray with 1 for every hidden cell and 0 otherwise
+#    'strides' how far apart (in flat indices) two cells adjacent along each
+#              axis are
+#    'hidden_safe'  how many safe cells are still hidden (see
+#                   hidden_safe_cells)
+#    'region_labels', 'regions'  optional precomputed openings (see
+#                                zero_regions)
+#    'version'  how many digs have changed the game so far, so that caches
+#               of its renders can tell when they are out of date
+#
+# Every cell is addressed by a single integer index, so no lookup has to walk
+# the nested lists.  new_game_nd and flat_game return flat games as Game
+# objects, but flat games kept as plain dictionaries work just as well.
+# Legacy games (with nested 'board' and 'hidden' lists) are still accepted
+# everywhere; they are converted with flat_game.
+
+BOMB = -1
+
+
+class Game:
+    """
+    A flat game, holding the same fields as the dictionaries described
+    above in slots rather than in a dictionary of its own.
+
+    Games are read and updated like dictionaries, so every function taking
+    a game accepts them.  On top of the fields it holds, a game can be asked
+    for 'board' and 'hidden', which build the nested lists of a legacy game
+    (changing those lists does not change the game).
+
+    >>> g = Game(dimensions=(1, 3), strides=(3, 1), cells=[BOMB, 1, 0],
+    ...          mask=bytearray(b"\\x01\\x01\\x00"), state="ongoing")
+    >>> g["board"], g["hidden"]
+    ([['.', 1, 0]], [[True, True, False]])
+    >>> "hidden_safe" in g, g.get("hidden_safe")
+    (False, None)
+    >>> g["hidden_safe"] = 1
+    >>> dump(g)
+    cells: [-1, 1, 0]
+    dimensions: (1, 3)
+    hidden_safe: 1
+    mask: bytearray(b'\\x01\\x01\\x00')
+    state: ongoing
+    strides: (3, 1)
+    >>> g["lazy"] = True
+    Traceback (most recent call last):
+    ...
+    KeyError: 'lazy'
+    """
+
+    __slots__ = (
+        "dimensions",
+        "strides",
+        "cells",
+        "mask",
+        "state",
+        "hidden_safe",
+        "version",
+        "region_labels",
+        "regions",
+        "flags",
+        "flag_count",
+    )
+
+    def __init__(self, **fields):
+        """
+        Makes a game with the given fields.
+        """
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        """
+        Returns the value of a field, or the nested 'board' or 'hidden'
+        lists.
+        """
+        if key == "board":
+            board = ["." if value == BOMB else value for value in self.cells]
+            return nest(board, self.dimensions)
+        if key == "hidden":
+            return nest(map(bool, self.mask), self.dimensions)
+        if key not in Game.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        """
+        Sets a field.
+        """
+        if key not in Game.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        """
+        Unsets a field.
+        """
+        if key not in self:
+            raise KeyError(key)
+        delattr(self, key)
+
+    def __contains__(self, key):
+        """
+        Returns True if the given field is set.
+        """
+        return key in Game.__slots__ and hasattr(self, key)
+
+    def __iter__(self):
+        """
+        Iterates over the names of the fields that are set.
+        """
+        return iter(self.keys())
+
+    def __len__(self):
+        """
+        Returns how many fields are set.
+        """
+        return len(self.keys())
+
+    def __repr__(self):
+        """
+        Returns a representation of the game listing its fields.
+        """
+        return f"Game({dict(self.items())!r})"
+
+    def __eq__(self, other):
+        """
+        Returns True if other is a game or dictionary with the same fields.
+        """
+        if isinstance(other, (Game, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def get(self, key, default=None):
+        """
+        Returns the value of the given field, or default if it is not set.
+        """
+        return getattr(self, key, default) if key in Game.__slots__ else default
+
+    def keys(self):
+        """
+        Returns the names of the fields that are set.
+        """
+        return [key for key in Game.__slots__ if hasattr(self, key)]
+
+    def items(self):
+        """
+        Returns the (name, value) pairs of the fields that are set.
+        """
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+
+def strides_of(dimensions):
+    """
+    Returns the row-major strides of a board with the given dimensions.
+
+    >>> strides_of((2, 4, 2))
+    (8, 2, 1)
+    >>> strides_of([5])
+    (1,)
+    """
+    strides = []
+    step = 1
+    for dim in reversed(dimensions):
+        strides.append(step)
+        step *= dim
+    return tuple(reversed(strides))
+
+
+def flat_index(coordinates, strides):
+    """
+    Returns the flat index of the cell at the given coordinates.
+
+    >>> flat_index((1, 2, 1), (8, 2, 1))
+    13
+    """
+    index = 0
+    for coordinate, stride in zip(coordinates, strides):
+        index += coordinate * stride
+    return index
+
+
+def checked_index(coordinates, dimensions, strides):
+    """
+    Returns the flat index of the cell at the given coordinates (see
+    flat_index), raising IndexError unless they name a cell of a board with
+    the given dimensions.
+
+    >>> checked_index((1, 2, 1), (2, 4, 2), (8, 2, 1))
+    13
+    >>> checked_index((0, 6), (4, 4), (4, 1))
+    Traceback (most recent call last):
+    ...
+    IndexError: coordinates (0, 6) out of range for dimensions (4, 4)
+    """
+    if len(coordinates) != len(dimensions) or not all(
+        0 <= coordinate < dim for coordinate, dim in zip(coordinates, dimensions)
+    ):
+        raise IndexError(
+            "coordinates %s out of range for dimensions %s"
+            % (tuple(coordinates), tuple(dimensions))
+        )
+    return flat_index(coordinates, strides)
+
+
+def flat_coordinates(index, dimensions):
+    """
+    Returns the coordinates of the cell at the given flat index (the inverse
+    of flat_index).
+
+    >>> flat_coordinates(13, (2, 4, 2))
+    (1, 2, 1)
+    """
+    coordinates = []
+    for dim in reversed(dimensions):
+        index, coordinate = divmod(index, dim)
+        coordinates.append(coordinate)
+    return tuple(reversed(coordinates))
+
+
+def flatten(nested, dimensions):
+    """
+    Returns the values of an N-d array (nested lists) as a flat, row-major
+    list.
+
+    >>> flatten([[[1, 2], [3, 4]], [[5, 6], [7, 8]]], (2, 2, 2))
+    [1, 2, 3, 4, 5, 6, 7, 8]
+    """
+    flat = list(nested)
+    for _ in range(len(dimensions) - 1):
+        flat = [value for row in flat for value in row]
+    return flat
+
+
+def nest(flat, dimensions):
+    """
+    Returns a flat, row-major list reshaped into an N-d array (nested lists)
+    with the given dimensions (the inverse of flatten).
+
+    >>> nest([1, 2, 3, 4, 5, 6, 7, 8], (2, 2, 2))
+    [[[1, 2], [3, 4]], [[5, 6], [7, 8]]]
+    """
+    nested = list(flat)
+    for dim in reversed(dimensions[1:]):
+        nested = [nested[i : i + dim] for i in range(0, len(nested), dim)]
+    return nested
+
+
+# Neighbor offset tables, shared by every board of the same dimensions.  A
+# cell's neighbors only depend on which edges of the board it touches, so the
+# flat index deltas are computed once per boundary code (see boundary_code)
+# and reused; interior cells all share code 0 and need no bounds checks.
+NEIGHBOR_TABLES = {}
+
+
+def neighbor_table(dimensions):
+    """
+    Returns the neighbor offset table for boards with the given dimensions,
+    a dictionary mapping boundary codes to lists of flat index deltas.  The
+    same table is returned for every board of that shape; its entries are
+    filled in by neighbor_deltas as they are needed.
+
+    >>> neighbor_table((3, 3)) is neighbor_table([3, 3])
+    True
+    """
+    shape = tuple(dimensions)
+    table = NEIGHBOR_TABLES.get(shape)
+    if table is None:
+        table = NEIGHBOR_TABLES[shape] = {}
+    return table
+
+
+def boundary_code(index, dimensions):
+    """
+    Returns an integer describing which edges of the board the cell at the
+    given flat index lies on: two bits per axis (the last axis in the lowest
+    bits), set to 1 on the low edge and 2 on the high edge.  Interior cells
+    have code 0.
+
+    >>> boundary_code(4, (3, 3))
+    0
+    >>> boundary_code(0, (3, 3))
+    5
+    >>> boundary_code(5, (3, 3))
+    2
+    """
+    code = 0
+    shift = 0
+    for dim in reversed(dimensions):
+        index, coordinate = divmod(index, dim)
+        if coordinate == 0:
+            code |= 1 << shift
+        if coordinate == dim - 1:
+            code |= 2 << shift
+        shift += 2
+    return code
+
+
+def neighbor_deltas(code, dimensions, strides):
+    """
+    Returns the flat index deltas of the neighbors (including the cell
+    itself) of any cell with the given boundary code, in the same order as
+    neighbors.
+
+    >>> neighbor_deltas(0, (3, 3), (3, 1))
+    [-4, -3, -2, -1, 0, 1, 2, 3, 4]
+    >>> neighbor_deltas(5, (3, 3), (3, 1))
+    [0, 1, 3, 4]
+    """
+    table = neighbor_table(dimensions)
+    deltas = table.get(code)
+    if deltas is None:
+        deltas = [0]
+        shift = 2 * len(strides)
+        for stride in strides:
+            shift -= 2
+            edge = code >> shift
+            steps = [0]
+            if not edge & 1:
+                steps.insert(0, -stride)
+            if not edge & 2:
+                steps.append(stride)
+            deltas = [delta + step for delta in deltas for step in steps]
+        table[code] = deltas
+    return deltas
+
+
+def neighbor_indices(index, dimensions, strides):
+    """
+    Returns the flat indices of all the neighbors of the cell at the given
+    flat index (including the cell itself).
+
+    >>> neighbor_indices(0, (2, 2, 2), (4, 2, 1))
+    [0, 1, 2, 3, 4, 5, 6, 7]
+    """
+    deltas = neighbor_deltas(boundary_code(index, dimensions), dimensions, strides)
+    return [index + delta for delta in deltas]
+
+
+def scatter_counts(dimensions, strides, bombs):
+    """
+    Returns the flat cells of a board with the given bombs, built by adding
+    one to every neighbor of every bomb.  This takes time proportional to the
+    number of bombs times 3**len(dimensions).
+
+    >>> scatter_counts((2, 4), (4, 1), [(0, 0), (1, 0), (1, 1)])
+    [-1, 3, 1, 0, -1, -1, 1, 0]
+    """
+    size = strides[0] * dimensions[0]
+    cells = [0] * size
+    for coordinate in bombs:
+        index = flat_index(coordinate, strides)
+        cells[index] = BOMB
+        code = boundary_code(index, dimensions)
+        for delta in neighbor_deltas(code, dimensions, strides):
+            if cells[index + delta] != BOMB:
+                cells[index + delta] += 1
+    return cells
+
+
+def box_sum_counts(dimensions, strides, bombs):
+    """
+    Returns the flat cells of a board with the given bombs (the same as
+    scatter_counts), built from a flat bomb indicator array with one 3-wide
+    running sum per axis.  This takes time proportional to the number of
+    cells times len(dimensions), however many bombs there are.
+
+    >>> box_sum_counts((2, 4), (4, 1), [(0, 0), (1, 0), (1, 1)])
+    [-1, 3, 1, 0, -1, -1, 1, 0]
+    """
+    size = strides[0] * dimensions[0]
+    indicator = [0] * size
+    for coordinate in bombs:
+        indicator[flat_index(coordinate, strides)] += 1
+
+    sums = indicator
+    for dim, stride in zip(dimensions, strides):
+        block = dim * stride
+        padding = [0] * stride
+        summed = []
+        for start in range(0, size, block):
+            padded = padding + sums[start : start + block] + padding
+            summed += [
+                before + here + after
+                for before, here, after in zip(
+                    padded, padded[stride:], padded[2 * stride :]
+                )
+            ]
+        sums = summed
+
+    return [BOMB if bomb else total for bomb, total in zip(indicator, sums)]
+
+
+def bomb_counts(dimensions, strides, bombs):
+    """
+    Returns the flat cells of a board with the given bombs, choosing between
+    scatter_counts and box_sum_counts by their estimated costs: the average
+    number of neighbors visited per bomb times the number of bombs for the
+    former, the number of cells times the number of axes for the latter.
+
+    >>> bomb_counts((2, 4), (4, 1), [(0, 0), (1, 0), (1, 1)])
+    [-1, 3, 1, 0, -1, -1, 1, 0]
+    """
+    bombs = list(bombs)
+    scatter_cost = len(bombs)
+    for dim in dimensions:
+        scatter_cost *= (3 * dim - 2) / dim
+    box_sum_cost = strides[0] * dimensions[0] * len(dimensions)
+    if scatter_cost > box_sum_cost:
+        return box_sum_counts(dimensions, strides, bombs)
+    return scatter_counts(dimensions, strides, bombs)
+
+
+def find_root(parents, index):
+    """
+    Returns the root of the union-find tree holding index, halving the path
+    to it along the way.
+
+    >>> parents = [0, 0, 1, 2]
+    >>> find_root(parents, 3), parents
+    (0, [0, 0, 1, 1])
+    """
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def zero_regions(dimensions, strides, cells):
+    """
+    Finds the openings of a board: the connected groups of cells with no
+    neighboring bombs (joined with union-find), each together with the
+    numbered cells bordering it.
+
+    Returns (labels, regions): labels has, for every flat index, the number
+    of the region of that cell if it has no neighboring bombs and -1
+    otherwise; regions[label] is the sorted list of the flat indices of
+    every cell that digging into that region reveals.
+
+    >>> zero_regions((1, 6), (6, 1), [0, 1, BOMB, 1, 0, 0])
+    ([0, -1, -1, -1, 1, 1], [[0, 1], [3, 4, 5]])
+    """
+    parents = list(range(len(cells)))
+    # each pair of neighbors only needs joining once, from its lower index
+    forward_deltas = {}
+    for index, value in enumerate(cells):
+        if value != 0:
+            continue
+        code = boundary_code(index, dimensions)
+        deltas = forward_deltas.get(code)
+        if deltas is None:
+            deltas = [
+                delta
+                for delta in neighbor_deltas(code, dimensions, strides)
+                if delta > 0
+            ]
+            forward_deltas[code] = deltas
+        root = find_root(parents, index)
+        for delta in deltas:
+            if cells[index + delta] == 0:
+                other = find_root(parents, index + delta)
+                if other < root:
+                    parents[root] = root = other
+                elif other > root:
+                    parents[other] = root
+
+    # roots are the smallest index of their group, so they are labeled first
+    labels = [-1] * len(cells)
+    members = []
+    for index, value in enumerate(cells):
+        if value == 0:
+            label = labels[find_root(parents, index)]
+            if label < 0:
+                label = len(members)
+                members.append([])
+            labels[index] = label
+            members[label].append(index)
+    for index, value in enumerate(cells):
+        if value > 0:
+            around = neighbor_indices(index, dimensions, strides)
+            bordered = {labels[neighbor] for neighbor in around}
+            bordered.discard(-1)
+            for label in bordered:
+                members[label].append(index)
+    return labels, [sorted(region) for region in members]
+
+
+def flat_game(game):
+    """
+    Returns the flat form of a game.  Flat games are returned unchanged;
+    legacy games (nested 'board' and 'hidden' lists), sparse games and
+    bitboard games are converted into a new flat game that shares nothing
+    with the original.
+
+    >>> g = flat_game({'dimensions': (2, 2),
+    ...                'board': [['.', 1], [1, 1]],
+    ...                'hidden': [[True, False], [True, True]],
+    ...                'state': 'ongoing'})
+    >>> dump(g)
+    cells: [-1, 1, 1, 1]
+    dimensions: (2, 2)
+    mask: bytearray(b'\\x01\\x00\\x01\\x01')
+    state: ongoing
+    strides: (2, 1)
+    >>> flat_game(g) is g
+    True
+    """
+    if "cells" in game:
+        return game
+    dimensions = tuple(game["dimensions"])
+    if "bombs" in game:
+        complete_counts(game)
+        size = game["strides"][0] * dimensions[0]
+        cells = [0] * size
+        for index, count in game["counts"].items():
+            cells[index] = count
+        for index in game["bombs"]:
+            cells[index] = BOMB
+        mask = bytearray(b"\x01") * size
+        for index in game["revealed"]:
+            mask[index] = 0
+        flat = Game(
+            dimensions=dimensions,
+            strides=game["strides"],
+            cells=cells,
+            mask=mask,
+            state=game["state"],
+            hidden_safe=game["hidden_safe"],
+        )
+    elif "bomb_rows" in game:
+        cells = []
+        mask = bytearray()
+        for row, hidden in enumerate(game["hidden_rows"]):
+            cells.extend(bitboard_row_values(game, row))
+            mask.extend(bit == "1" for bit in bit_string(hidden, dimensions[1]))
+        flat = Game(
+            dimensions=dimensions,
+            strides=game["strides"],
+            cells=cells,
+            mask=mask,
+            state=game["state"],
+            hidden_safe=game["hidden_safe"],
+        )
     else:
-        result = []
-        for i in all_possible_coordinates(dimensions[1:]):
-            for j in range(dimensions[0]):
-                result.append((j,) + i)
-    return result
+        flat = Game(
+            dimensions=dimensions,
+            strides=strides_of(dimensions),
+            cells=[
+                BOMB if value == "." else value
+                for value in flatten(game["board"], dimensions)
+            ],
+            mask=bytearray(flatten(game["hidden"], dimensions)),
+            state=game["state"],
+        )
+    if "flag_count" in game:
+        flat["flags"] = flag_bytes(flagged_indices(game), len(flat["cells"]))
+        flat["flag_count"] = game["flag_count"]
+    return flat
+
+
+def legacy_game(game):
+    """
+    Returns the legacy form of a game, with nested 'board' and 'hidden'
+    lists.  Legacy games are returned unchanged.
+
+    >>> dump(legacy_game(new_game_nd((2, 2), [(0, 0)], legacy=False)))
+    board:
+        ['.', 1]
+        [1, 1]
+    dimensions: (2, 2)
+    hidden:
+        [True, True]
+        [True, True]
+    state: ongoing
+    """
+    if "board" in game:
+        return game
+    game = flat_game(game)
+    dimensions = game["dimensions"]
+    legacy = {
+        "dimensions": dimensions,
+        "board": nest(
+            ["." if value == BOMB else value for value in game["cells"]], dimensions
+        ),
+        "hidden": nest(map(bool, game["mask"]), dimensions),
+        "state": game["state"],
+    }
+    if "flag_count" in game:
+        legacy["flags"] = bytearray(game["flags"])
+        legacy["flag_count"] = game["flag_count"]
+    return legacy
+
+
+def hidden_safe_cells(game):
+    """
+    Returns how many safe cells of a flat game are still hidden.
+
+    The count is kept up to date by dig_flat, so this takes constant time.
+    Flat games saved without the counter have it computed here, once.
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)], legacy=False)
+    >>> hidden_safe_cells(g)
+    5
+    >>> del g['hidden_safe']
+    >>> hidden_safe_cells(g)
+    5
+    >>> g['hidden_safe']
+    5
+    """
+    remaining = game.get("hidden_safe")
+    if remaining is None:
+        remaining = 0
+        for value, hidden in zip(game["cells"], game["mask"]):
+            if hidden and value != BOMB:
+                remaining += 1
+        game["hidden_safe"] = remaining
+    return remaining
+
+
+def dig_flat(game, index):
+    """
+    Dig up the cell at the given flat index of a flat game, and reveal its
+    neighbors the same way dig_nd does.
+
+    Returns the list of flat indices that were revealed.
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)], legacy=False)
+    >>> dig_flat(g, 3)
+    [3, 2, 6, 7]
+    >>> g['state']
+    'ongoing'
+    """
+    mask = game["mask"]
+    if game["state"] != "ongoing" or not mask[index]:
+        return []
+    remaining = hidden_safe_cells(game)
+    mask[index] = 0
+    revealed = [index]
+    if game["cells"][index] == BOMB:
+        game["state"] = "defeat"
+        return revealed
+    reveal_flat(game, index, revealed)
+    remaining -= len(revealed)
+    game["hidden_safe"] = remaining
+    if remaining == 0:
+        game["state"] = "victory"
+    return revealed
+
+
+def reveal_flat(game, index, revealed):
+    """
+    Reveal the neighbors of an already revealed cell of a flat game if it is
+    not adjacent to any bomb, and so on for every revealed neighbor.  Newly
+    revealed flat indices are appended to revealed.
+
+    The opening is flood-filled with an explicit stack, so the Python stack
+    depth does not grow with its size; the hidden mask doubles as the visited
+    set, since a cell is only pushed when it is revealed.  Games with
+    precomputed openings (see zero_regions) reveal the hidden cells of the
+    opening straight from its member list instead, unless they have flagged
+    squares, which can split an opening: openings never spread to flagged
+    squares.
+
+    >>> g = new_game_nd((1, 3), [(0, 0)], legacy=False)
+    >>> revealed = []
+    >>> reveal_flat(g, 2, revealed)
+    >>> revealed
+    [1, 2]
+    """
+    cells = game["cells"]
+    mask = game["mask"]
+    labels = game.get("region_labels")
+    if labels is not None and labels[index] >= 0 and not game.get("flag_count"):
+        for member in game["regions"][labels[index]]:
+            if mask[member]:
+                mask[member] = 0
+                revealed.append(member)
+        return
+    flags = game["flags"] if game.get("flag_count") else None
+    dimensions = game["dimensions"]
+    strides = game["strides"]
+    stack = [index]
+    while stack:
+        index = stack.pop()
+        if cells[index] != 0:
+            continue
+        deltas = neighbor_deltas(boundary_code(index, dimensions), dimensions, strides)
+        for delta in deltas:
+            neighbor = index + delta
+            if mask[neighbor]:
+                if flags is not None and flags[neighbor >> 3] >> (neighbor & 7) & 1:
+                    continue
+                mask[neighbor] = 0
+                revealed.append(neighbor)
+                if cells[neighbor] == 0:
+                    stack.append(neighbor)
+
+
+def cell_symbols(cells):
+    """
+    Returns a dictionary mapping every value in cells to the string used to
+    display it.
+
+    >>> cell_symbols([BOMB, 0, 3]) == {BOMB: '.', 0: ' ', 3: '3'}
+    True
+    """
+    symbols = {value: str(value) for value in set(cells)}
+    symbols[BOMB] = "."
+    symbols[0] = " "
+    return symbols
+
+
+def revealed_cells(game, indices):
+    """
+    Returns the (coordinates, string) pair of the cells of a flat, sparse
+    or bitboard game at the given flat indices, with the strings render_nd shows for
+    them once they are revealed.
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)], legacy=False)
+    >>> revealed_cells(g, [1, 4, 7])
+    [((0, 1), '3'), ((1, 0), '.'), ((1, 3), ' ')]
+    """
+    dimensions = game["dimensions"]
+    values = cell_values(game, indices)
+    symbols = cell_symbols(values)
+    return [
+        (flat_coordinates(index, dimensions), symbols[value])
+        for index, value in zip(indices, values)
+    ]
+
+
+def render_flat(game, xray=False):
+    """
+    Returns the display strings of every cell of a flat game, as a flat,
+    row-major list (see render_nd).
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)], legacy=False)
+    >>> render_flat(g, True)
+    ['.', '3', '1', ' ', '.', '.', '1', ' ']
+    >>> dig_flat(g, 3)
+    [3, 2, 6, 7]
+    >>> render_flat(g)
+    ['_', '_', '1', ' ', '_', '_', '1', ' ']
+    """
+    cells = game["cells"]
+    symbols = cell_symbols(cells)
+    if xray:
+        return [symbols[value] for value in cells]
+    rendered = [
+        "_" if hidden else symbols[value] for value, hidden in zip(cells, game["mask"])
+    ]
+    return overlay_flags(game, rendered)
+
+
+# SPARSE BOARD ENGINE
+#
+# Games built by new_sparse_game only store what sets a cell apart from a
+# hidden cell with no neighboring bombs:
+#
+#    'bombs'     dictionary mapping the flat index of every bomb to the
+#                number of times it was listed (neighbor counts include
+#                repeated bombs once per listing, as in new_game_nd)
+#    'counts'    dictionary mapping flat indices of safe cells to their
+#                neighbor counts; cells missing from it have a count of 0
+#    'revealed'  set of the flat indices of the revealed cells
+#    'lazy'      whether 'counts' is only filled in as cells are looked at
+#                (see sparse_count)
+#
+# alongside 'dimensions', 'strides', 'state', 'hidden_safe' and 'version' as
+# in flat games.  Their memory grows with the number of bombs and revealed cells
+# rather than with the volume of the board.
+
+
+def sparse_bombs(bombs, strides):
+    """
+    Returns the 'bombs' dictionary of a sparse game with the given bombs.
+
+    >>> sparse_bombs([(0, 0), (1, 1), (0, 0)], (4, 1))
+    {0: 2, 5: 1}
+    """
+    indices = {}
+    for coordinate in bombs:
+        index = flat_index(coordinate, strides)
+        indices[index] = indices.get(index, 0) + 1
+    return indices
+
+
+def scatter_sparse_counts(dimensions, strides, bombs):
+    """
+    Returns the nonzero neighbor counts of the safe cells around the given
+    'bombs' dictionary (see scatter_counts).
+
+    >>> scatter_sparse_counts((1, 4), (4, 1), {0: 1, 3: 1})
+    {1: 1, 2: 1}
+    """
+    counts = {}
+    for index, listed in bombs.items():
+        code = boundary_code(index, dimensions)
+        for delta in neighbor_deltas(code, dimensions, strides):
+            neighbor = index + delta
+            if neighbor not in bombs:
+                counts[neighbor] = counts.get(neighbor, 0) + listed
+    return counts
+
+
+def new_sparse_game(dimensions, bombs, lazy=False):
+    """
+    Start a new game in the sparse form.
+
+    Unless lazy is True, the neighbor counts of every cell next to a bomb
+    are computed up front.  Lazy games only index their bombs, so starting
+    one takes time proportional to the number of bombs; counts are computed
+    the first time a dig or a render needs them.
+
+    >>> g = new_sparse_game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> sorted(g['bombs']), sorted(g['counts'].items())
+    ([0, 4, 5], [(1, 3), (2, 1), (6, 1)])
+    >>> g['hidden_safe']
+    5
+    >>> new_sparse_game((2, 4), [(0, 0), (1, 0), (1, 1)], lazy=True)['counts']
+    {}
+    """
+    shape = tuple(dimensions)
+    strides = strides_of(shape)
+    bomb_indices = sparse_bombs(bombs, strides)
+    if lazy:
+        counts = {}
+    else:
+        counts = scatter_sparse_counts(shape, strides, bomb_indices)
+
+    return {
+        "dimensions": shape,
+        "strides": strides,
+        "bombs": bomb_indices,
+        "counts": counts,
+        "revealed": set(),
+        "lazy": lazy,
+        "state": "ongoing",
+        "hidden_safe": strides[0] * shape[0] - len(bomb_indices),
+        "version": 0,
+    }
+
+
+def sparse_count(game, index):
+    """
+    Returns the neighbor count of the safe cell at the given flat index of a
+    sparse game.  In lazy games, the count is computed from the bomb index
+    the first time the cell is looked at, then remembered.
+
+    >>> g = new_sparse_game((2, 4), [(0, 0), (1, 0), (1, 1)], lazy=True)
+    >>> sparse_count(g, 1), sparse_count(g, 3)
+    (3, 0)
+    >>> g['counts']
+    {1: 3, 3: 0}
+    """
+    counts = game["counts"]
+    count = counts.get(index)
+    if count is None:
+        if not game.get("lazy"):
+            return 0
+        bombs = game["bombs"]
+        dimensions = game["dimensions"]
+        code = boundary_code(index, dimensions)
+        count = 0
+        for delta in neighbor_deltas(code, dimensions, game["strides"]):
+            count += bombs.get(index + delta, 0)
+        counts[index] = count
+    return count
+
+
+def complete_counts(game):
+    """
+    Makes the 'counts' of a lazy sparse game complete, so that it no longer
+    needs to be filled in lazily.
+
+    >>> g = new_sparse_game((1, 4), [(0, 0)], lazy=True)
+    >>> complete_counts(g)
+    >>> g['counts'], g['lazy']
+    ({1: 1}, False)
+    """
+    if game.get("lazy"):
+        game["counts"].update(
+            scatter_sparse_counts(game["dimensions"], game["strides"], game["bombs"])
+        )
+        game["lazy"] = False
+
+
+def cell_values(game, indices):
+    """
+    Returns the neighbor counts (BOMB for bombs) of the cells of a flat,
+    sparse or bitboard game at the given flat indices.
+
+    >>> cell_values(new_sparse_game((1, 3), [(0, 0)]), [0, 1, 2])
+    [-1, 1, 0]
+    """
+    if "cells" in game:
+        cells = game["cells"]
+        return [cells[index] for index in indices]
+    if "bomb_rows" in game:
+        return bitboard_values(game, indices)
+    bombs = game["bombs"]
+    return [BOMB if index in bombs else sparse_count(game, index) for index in indices]
+
+
+def hidden_flags(game, indices):
+    """
+    Returns whether each of the cells of a flat, sparse or bitboard game at
+    the given flat indices is hidden.
+
+    >>> g = new_sparse_game((1, 3), [(0, 0)])
+    >>> dig_sparse(g, 2)
+    [2, 1]
+    >>> hidden_flags(g, [0, 1, 2])
+    [True, False, False]
+    """
+    if "cells" in game:
+        mask = game["mask"]
+        return [bool(mask[index]) for index in indices]
+    if "bomb_rows" in game:
+        num_cols = game["dimensions"][1]
+        hidden_rows = game["hidden_rows"]
+        return [
+            bool(hidden_rows[index // num_cols] >> index % num_cols & 1)
+            for index in indices
+        ]
+    revealed = game["revealed"]
+    return [index not in revealed for index in indices]
+
+
+def dig_sparse(game, index):
+    """
+    Dig up the cell at the given flat index of a sparse game (see dig_flat).
+
+    Returns the list of flat indices that were revealed.
+
+    >>> g = new_sparse_game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_sparse(g, 3)
+    [3, 2, 6, 7]
+    >>> dig_sparse(g, 1), g['state']
+    ([1], 'victory')
+    """
+    revealed_set = game["revealed"]
+    if game["state"] != "ongoing" or index in revealed_set:
+        return []
+    revealed_set.add(index)
+    revealed = [index]
+    if index in game["bombs"]:
+        game["state"] = "defeat"
+        return revealed
+    reveal_sparse(game, index, revealed)
+    game["hidden_safe"] -= len(revealed)
+    if game["hidden_safe"] == 0:
+        game["state"] = "victory"
+    return revealed
+
+
+def reveal_sparse(game, index, revealed):
+    """
+    Reveal the opening around an already revealed cell of a sparse game
+    (see reveal_flat).  Newly revealed flat indices are appended to
+    revealed.
+
+    >>> g = new_sparse_game((1, 3), [(0, 0)])
+    >>> revealed = []
+    >>> reveal_sparse(g, 2, revealed)
+    >>> revealed
+    [1, 2]
+    """
+    revealed_set = game["revealed"]
+    flags = game["flags"] if game.get("flag_count") else ()
+    dimensions = game["dimensions"]
+    strides = game["strides"]
+    stack = [index]
+    while stack:
+        index = stack.pop()
+        if sparse_count(game, index):
+            continue
+        deltas = neighbor_deltas(boundary_code(index, dimensions), dimensions, strides)
+        for delta in deltas:
+            neighbor = index + delta
+            if neighbor not in revealed_set and neighbor not in flags:
+                revealed_set.add(neighbor)
+                revealed.append(neighbor)
+                if not sparse_count(game, neighbor):
+                    stack.append(neighbor)
+
+
+def render_sparse(game, xray=False):
+    """
+    Returns the display strings of every cell of a sparse game, as a flat,
+    row-major list (see render_nd).
+
+    >>> g = new_sparse_game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_sparse(g, 3)
+    [3, 2, 6, 7]
+    >>> render_sparse(g)
+    ['_', '_', '1', ' ', '_', '_', '1', ' ']
+    """
+    size = game["strides"][0] * game["dimensions"][0]
+    if xray:
+        complete_counts(game)
+        rendered = [" "] * size
+        for index, count in game["counts"].items():
+            if count:
+                rendered[index] = str(count)
+        for index in game["bombs"]:
+            rendered[index] = "."
+        return rendered
+    rendered = ["_"] * size
+    indices = list(game["revealed"])
+    values = cell_values(game, indices)
+    symbols = cell_symbols(values)
+    for index, value in zip(indices, values):
+        rendered[index] = symbols[value]
+    return overlay_flags(game, rendered)
+
+
+# 2-D BITBOARD ENGINE
+#
+# Games built by new_bitboard_2d keep every row of a 2-D board as Python
+# integers used as bitmasks, bit c standing for the cell in column c:
+#
+#    'bomb_rows'    list with the mask of the bombs of every row
+#    'hidden_rows'  list with the mask of the hidden cells of every row
+#    'zero_rows'    list with the mask of the safe cells of every row that
+#                   have no neighboring bombs
+#    'extra_bombs'  dictionary mapping the flat index of every bomb listed
+#                   more than once to the number of extra times it is listed
+#
+# alongside 'dimensions', 'strides', 'state', 'hidden_safe' and 'version' as
+# in flat games, so a board takes 3 bits per cell.  Neighbor counts are not stored:
+# they are added up from the bomb masks with bitwise adders when a dig or a
+# render needs them, and openings are flood-filled a whole row at a time.
+# As in the other forms, a bomb listed more than once is counted every time:
+# the masks count it once and 'extra_bombs' adds the rest.
+
+
+def bit_string(bits, width):
+    """
+    Returns the lowest width bits of bits as a string of '0' and '1'
+    characters, lowest bit first.
+
+    >>> bit_string(0b1101, 6)
+    '101100'
+    """
+    return bin(bits | 1 << width)[:2:-1]
+
+
+def set_bits(bits):
+    """
+    Returns the positions of the set bits of bits, lowest first.
+
+    >>> set_bits(0b101100)
+    [2, 3, 5]
+    """
+    return [position for position, bit in enumerate(bin(bits)[:1:-1]) if bit == "1"]
+
+
+def spread_bits(bits, full):
+    """
+    Returns the mask of the cells of bits and of the cells next to them in
+    the same row, within the row mask full.
+
+    >>> bin(spread_bits(0b100100, 0b111111))
+    '0b111110'
+    """
+    return (bits | bits << 1 | bits >> 1) & full
+
+
+def fill_bits(seed, allowed):
+    """
+    Returns the cells of allowed that are in the same run of adjacent
+    allowed cells as a cell of seed.  The runs are grown with shifts that
+    double at every step, so a run of any length takes a logarithmic number
+    of steps.
+
+    >>> bin(fill_bits(0b0000100, 0b1101110))
+    '0b1110'
+    """
+    up = down = seed & allowed
+    up_allowed = down_allowed = allowed
+    shift = 1
+    width = allowed.bit_length()
+    while shift < width:
+        up |= up_allowed & up << shift
+        down |= down_allowed & down >> shift
+        up_allowed &= up_allowed << shift
+        down_allowed &= down_allowed >> shift
+        shift <<= 1
+    return up | down
+
+
+def add_bits(planes, bits):
+    """
+    Adds one to the number kept for every cell of bits in the bit planes
+    planes (bit k of a cell's number is in planes[k]), rippling the carries
+    through the planes as a bitwise adder.
+
+    >>> planes = []
+    >>> for bits in (0b011, 0b110, 0b111):
+    ...     add_bits(planes, bits)
+    >>> [bin(plane) for plane in planes]
+    ['0b10', '0b111']
+    """
+    for k, plane in enumerate(planes):
+        if not bits:
+            return
+        planes[k] = plane ^ bits
+        bits &= plane
+    if bits:
+        planes.append(bits)
+
+
+def count_planes(bomb_rows, row, full):
+    """
+    Returns the neighbor counts of the cells of a row, as bit planes (see
+    add_bits), from the bomb masks of the rows of a board.
+
+    >>> [bin(plane) for plane in count_planes([0b0011, 0b0001], 1, 0b1111)]
+    ['0b110', '0b11']
+    """
+    planes = []
+    for other in range(max(row - 1, 0), min(row + 2, len(bomb_rows))):
+        bits = bomb_rows[other]
+        if bits:
+            add_bits(planes, bits << 1 & full)
+            add_bits(planes, bits >> 1)
+            if other != row:
+                add_bits(planes, bits)
+    return planes
+
+
+def bitboard_row_values(game, row):
+    """
+    Returns the neighbor counts (BOMB for bombs) of the cells of a row of a
+    bitboard game.
+
+    >>> bitboard_row_values(new_bitboard_2d(2, 4, [(0, 0), (1, 0), (1, 1)]), 0)
+    [-1, 3, 1, 0]
+    >>> bitboard_row_values(new_bitboard_2d(1, 3, [(0, 0), (0, 0)]), 0)
+    [-1, 2, 0]
+    """
+    num_cols = game["dimensions"][1]
+    bomb_rows = game["bomb_rows"]
+    values = [0] * num_cols
+    for k, plane in enumerate(count_planes(bomb_rows, row, (1 << num_cols) - 1)):
+        for col in set_bits(plane):
+            values[col] += 1 << k
+    for index, extra in game["extra_bombs"].items():
+        bomb_row, bomb_col = divmod(index, num_cols)
+        if abs(bomb_row - row) <= 1:
+            for col in range(max(bomb_col - 1, 0), min(bomb_col + 2, num_cols)):
+                values[col] += extra
+    for col in set_bits(bomb_rows[row]):
+        values[col] = BOMB
+    return values
+
+
+def new_bitboard_2d(num_rows, num_cols, bombs):
+    """
+    Start a new 2-D game in the bitboard form.
+
+    >>> g = new_bitboard_2d(2, 4, [(0, 0), (1, 0), (1, 1)])
+    >>> [bin(bits) for bits in g['bomb_rows']]
+    ['0b1', '0b11']
+    >>> [bin(bits) for bits in g['zero_rows']]
+    ['0b1000', '0b1000']
+    >>> g['hidden_safe']
+    5
+    """
+    full = (1 << num_cols) - 1
+    bomb_rows = [0] * num_rows
+    extra_bombs = {}
+    for row, col in bombs:
+        if bomb_rows[row] >> col & 1:
+            index = row * num_cols + col
+            extra_bombs[index] = extra_bombs.get(index, 0) + 1
+        bomb_rows[row] |= 1 << col
+    zero_rows = []
+    for row in range(num_rows):
+        near = 0
+        for bits in bomb_rows[max(row - 1, 0) : row + 2]:
+            near |= bits
+        zero_rows.append(full & ~spread_bits(near, full))
+
+    return {
+        "dimensions": (num_rows, num_cols),
+        "strides": (num_cols, 1),
+        "bomb_rows": bomb_rows,
+        "hidden_rows": [full] * num_rows,
+        "zero_rows": zero_rows,
+        "extra_bombs": extra_bombs,
+        "state": "ongoing",
+        "hidden_safe": num_rows * num_cols - sum(map(int.bit_count, bomb_rows)),
+        "version": 0,
+    }
+
+
+def bitboard_values(game, indices):
+    """
+    Returns the neighbor counts (BOMB for bombs) of the cells of a bitboard
+    game at the given flat indices.
+
+    >>> bitboard_values(new_bitboard_2d(2, 4, [(0, 0), (1, 0), (1, 1)]), [0, 1, 7])
+    [-1, 3, 0]
+    """
+    bomb_rows = game["bomb_rows"]
+    extra_bombs = game["extra_bombs"]
+    num_cols = game["dimensions"][1]
+    values = []
+    for index in indices:
+        row, col = divmod(index, num_cols)
+        if bomb_rows[row] >> col & 1:
+            values.append(BOMB)
+            continue
+        window = 7 << col >> 1
+        near = bomb_rows[max(row - 1, 0) : row + 2]
+        count = sum((bits & window).bit_count() for bits in near)
+        for other, extra in extra_bombs.items():
+            other_row, other_col = divmod(other, num_cols)
+            if abs(other_row - row) <= 1 and abs(other_col - col) <= 1:
+                count += extra
+        values.append(count)
+    return values
+
+
+def dig_bitboard(game, index):
+    """
+    Dig up the cell at the given flat index of a bitboard game (see
+    dig_flat).
+
+    Returns the list of flat indices that were revealed: the dug cell
+    first, then the rest of the opening row by row.
+
+    >>> g = new_bitboard_2d(2, 4, [(0, 0), (1, 0), (1, 1)])
+    >>> dig_bitboard(g, 3)
+    [3, 2, 6, 7]
+    >>> dig_bitboard(g, 1), g['state']
+    ([1], 'victory')
+    """
+    row, col = divmod(index, game["dimensions"][1])
+    bit = 1 << col
+    hidden_rows = game["hidden_rows"]
+    if game["state"] != "ongoing" or not hidden_rows[row] & bit:
+        return []
+    hidden_rows[row] ^= bit
+    revealed = [index]
+    if game["bomb_rows"][row] & bit:
+        game["state"] = "defeat"
+        return revealed
+    reveal_bitboard(game, index, revealed)
+    game["hidden_safe"] -= len(revealed)
+    if game["hidden_safe"] == 0:
+        game["state"] = "victory"
+    return revealed
+
+
+def grow_region(region, row, allowed, full):
+    """
+    Adds to region[row] every cell of allowed connected to the region
+    through the rows above and below it (see reveal_bitboard).  Returns True
+    if the region grew.
+
+    >>> region = {0: 0b1}
+    >>> grow_region(region, 1, 0b1110, 0b1111), bin(region[1])
+    (True, '0b1110')
+    """
+    current = region.get(row, 0)
+    near = region.get(row - 1, 0) | region.get(row + 1, 0)
+    new = spread_bits(near, full) & allowed & ~current
+    if not new:
+        return False
+    region[row] = current | fill_bits(new, allowed)
+    return True
+
+
+def reveal_bitboard(game, index, revealed):
+    """
+    Reveal the opening around an already revealed cell of a bitboard game
+    (see reveal_flat).  Newly revealed flat indices are appended to
+    revealed.
+
+    The hidden cells with no neighboring bombs that the opening spreads
+    through are found a row at a time: every row takes in the runs of such
+    cells touching the region found so far in the rows above and below it,
+    sweeping down and up until the region stops growing.  The region and
+    its border are then revealed with one mask operation per row.  Flagged
+    squares are left out of both.
+
+    >>> g = new_bitboard_2d(1, 3, [(0, 0)])
+    >>> revealed = []
+    >>> reveal_bitboard(g, 2, revealed)
+    >>> revealed
+    [1, 2]
+    """
+    num_rows, num_cols = game["dimensions"]
+    row, col = divmod(index, num_cols)
+    zero_rows = game["zero_rows"]
+    hidden_rows = game["hidden_rows"]
+    seed = zero_rows[row] & 1 << col
+    if not seed:
+        return
+    if game.get("flag_count"):
+        diggable = [
+            hidden & ~flags for hidden, flags in zip(hidden_rows, game["flag_rows"])
+        ]
+    else:
+        diggable = hidden_rows
+    full = (1 << num_cols) - 1
+    region = {row: fill_bits(seed, zero_rows[row] & diggable[row] | seed)}
+    top = bottom = row
+
+    growing = True
+    while growing:
+        growing = False
+        other = max(top - 1, 0)
+        while other <= min(bottom + 1, num_rows - 1):
+            if grow_region(region, other, zero_rows[other] & diggable[other], full):
+                growing = True
+                top, bottom = min(top, other), max(bottom, other)
+            other += 1
+        other = min(bottom + 1, num_rows - 1)
+        while other >= max(top - 1, 0):
+            if grow_region(region, other, zero_rows[other] & diggable[other], full):
+                growing = True
+                top, bottom = min(top, other), max(bottom, other)
+            other -= 1
+
+    for other in range(max(top - 1, 0), min(bottom + 2, num_rows)):
+        near = region.get(other - 1, 0) | region.get(other + 1, 0)
+        newly = spread_bits(near | region.get(other, 0), full) & diggable[other]
+        if newly:
+            hidden_rows[other] ^= newly
+            offset = other * num_cols
+            revealed.extend(offset + position for position in set_bits(newly))
+
+
+def render_bitboard_row(game, row, xray=False):
+    """
+    Returns the display strings of the cells of a row of a bitboard game.
+
+    >>> render_bitboard_row(new_bitboard_2d(2, 4, [(0, 0), (1, 0), (1, 1)]), 0, True)
+    ['.', '3', '1', ' ']
+    """
+    num_cols = game["dimensions"][1]
+    hidden = game["hidden_rows"][row]
+    if xray:
+        values = bitboard_row_values(game, row)
+        symbols = cell_symbols(values)
+        return [symbols[value] for value in values]
+    if hidden == (1 << num_cols) - 1:
+        rendered = ["_"] * num_cols
+    else:
+        values = bitboard_row_values(game, row)
+        symbols = cell_symbols(values)
+        rendered = [
+            "_" if is_hidden == "1" else symbols[value]
+            for value, is_hidden in zip(values, bit_string(hidden, num_cols))
+        ]
+    if game.get("flag_count"):
+        for col in set_bits(game["flag_rows"][row]):
+            rendered[col] = "F"
+    return rendered
+
+
+def render_bitboard(game, xray=False):
+    """
+    Returns the display strings of every cell of a bitboard game, as a list
+    of rows (see render_2d_locations).
+
+    >>> g = new_bitboard_2d(2, 4, [(0, 0), (1, 0), (1, 1)])
+    >>> dig_bitboard(g, 3)
+    [3, 2, 6, 7]
+    >>> render_bitboard(g)
+    [['_', '_', '1', ' '], ['_', '_', '1', ' ']]
+    >>> render_bitboard(g, True)
+    [['.', '3', '1', ' '], ['.', '.', '1', ' ']]
+    """
+    return [
+        render_bitboard_row(game, row, xray) for row in range(game["dimensions"][0])
+    ]
+
+
+# FLAGS
+#
+# Hidden squares of any game can be flagged.  The flags are kept next to the
+# hidden cells, in the same shape as them:
+#
+#    'flags'       for flat and legacy games, a bytearray with one bit per
+#                  cell (bit index % 8 of byte index // 8); for sparse
+#                  games, the set of the flat indices of the flagged cells
+#    'flag_rows'   for bitboard games, the mask of the flagged cells of
+#                  every row
+#    'flag_count'  how many squares are flagged
+#
+# Games start without these fields, and get them when the first square is
+# flagged (see flag_nd).  Digs leave flagged squares hidden (see dig_board),
+# and renders show them as 'F'.
+
+
+def flag_bytes(indices, size):
+    """
+    Returns the bytearray of the 'flags' of a flat game of the given size
+    with the squares at the given flat indices flagged.
+
+    >>> flag_bytes([1, 9], 12)
+    bytearray(b'\\x02\\x02')
+    """
+    flags = bytearray((size + 7) // 8)
+    for index in indices:
+        flags[index >> 3] |= 1 << (index & 7)
+    return flags
+
+
+def flagged_indices(game):
+    """
+    Returns the sorted flat indices of the flagged squares of a game.
+
+    >>> g = new_game_nd((2, 4), [(0, 0)], legacy=False)
+    >>> flag_nd(g, (1, 2)), flag_nd(g, (0, 1))
+    (True, True)
+    >>> flagged_indices(g)
+    [1, 6]
+    """
+    if not game.get("flag_count"):
+        return []
+    if "bomb_rows" in game:
+        num_cols = game["dimensions"][1]
+        return [
+            row * num_cols + col
+            for row, bits in enumerate(game["flag_rows"])
+            for col in set_bits(bits)
+        ]
+    if "bombs" in game:
+        return sorted(game["flags"])
+    return set_bits(int.from_bytes(game["flags"], "little"))
+
+
+def flag_marks(game, indices):
+    """
+    Returns whether each of the squares of a game at the given flat indices
+    is flagged.
+
+    >>> g = new_sparse_game((1, 3), [(0, 0)])
+    >>> flag_nd(g, (0, 0))
+    True
+    >>> flag_marks(g, [0, 1, 2])
+    [True, False, False]
+    """
+    if not game.get("flag_count"):
+        return [False] * len(indices)
+    if "bomb_rows" in game:
+        num_cols = game["dimensions"][1]
+        flag_rows = game["flag_rows"]
+        return [
+            bool(flag_rows[index // num_cols] >> index % num_cols & 1)
+            for index in indices
+        ]
+    flags = game["flags"]
+    if "bombs" in game:
+        return [index in flags for index in indices]
+    return [bool(flags[index >> 3] >> (index & 7) & 1) for index in indices]
+
+
+def overlay_flags(game, rendered, indices=None):
+    """
+    Replaces with 'F' the strings of the flagged squares in a flat list of
+    strings rendered from a game: the whole board, or the squares at the
+    given flat indices.
+
+    >>> g = new_game_nd((1, 3), [(0, 0)], legacy=False)
+    >>> flag_nd(g, (0, 2))
+    True
+    >>> overlay_flags(g, ['_', '_', '_'])
+    ['_', '_', 'F']
+    """
+    if game.get("flag_count"):
+        if indices is None:
+            for index in flagged_indices(game):
+                rendered[index] = "F"
+        else:
+            for position, flagged in enumerate(flag_marks(game, indices)):
+                if flagged:
+                    rendered[position] = "F"
+    return rendered
 
 
 # N-D IMPLEMENTATION
 
 
-def new_game_nd(dimensions, bombs):
+def new_game_nd(dimensions, bombs, legacy=True, regions=False):
     """
     Start a new game.
 
     Return a game state dictionary, with the 'dimensions', 'state', 'board' and
     'hidden' fields adequately initialized.
 
+    The board is always built in the flat form (see flat_game).  Unless
+    legacy is False, it is then converted to nested 'board' and 'hidden'
+    lists.
 
     Args:
        dimensions (tuple): Dimensions of the board
        bombs (list): Bomb locations as a list of tuples, each an
                      N-dimensional coordinate
+       legacy (bool): Whether to return the game with nested lists
+       regions (bool): Whether to precompute the openings of the board
+                       (see zero_regions), so that digging into one reveals
+                       it from a list instead of flood-filling it; only
+                       flat games (legacy=False) keep them
 
     Returns:
        A game state dictionary
@@ -433,26 +1960,29 @@ def new_game_nd(dimensions, bombs):
         [[True, True], [True, True], [True, True], [True, True]]
     state: ongoing
     """
-    board = create_array(dimensions, 0)
-
-    hidden = create_array(dimensions, True)
-
-    for coordinate in bombs:
-        replace_value(board, coordinate, ".")
-        for neighbor in neighbors(coordinate, dimensions):
-            value = get_value(board, neighbor)
-            if not value == ".":
-                replace_value(board, neighbor, value + 1)
-
-    return {
-        "dimensions": dimensions,
-        "board": board,
-        "hidden": hidden,
-        "state": "ongoing",
-    }
-
-
-def dig_nd(game, coordinates):
+    shape = tuple(dimensions)
+    strides = strides_of(shape)
+    size = strides[0] * shape[0]
+    cells = bomb_counts(shape, strides, bombs)
+
+    game = Game(
+        dimensions=shape,
+        strides=strides,
+        cells=cells,
+        mask=bytearray(b"\x01") * size,
+        state="ongoing",
+        hidden_safe=size - cells.count(BOMB),
+        version=0,
+    )
+    if legacy:
+        game = legacy_game(game)
+        game["dimensions"] = dimensions
+    elif regions:
+        game["region_labels"], game["regions"] = zero_regions(shape, strides, cells)
+    return game
+
+
+def dig_nd(game, coordinates, delta=False):
     """
     Recursively dig up square at coords and neighboring squares.
 
@@ -465,12 +1995,21 @@ def dig_nd(game, coordinates):
     The updated state is 'defeat' when at least one bomb is revealed on the
     board after digging, 'victory' when all safe squares (squares that do
     not contain a bomb) and no bombs are revealed, and 'ongoing' otherwise.
+    Games with a 'version' have it increased by every dig that reveals
+    something.
 
     Args:
        coordinates (tuple): Where to start digging
+       delta (bool): Whether to return the revealed squares themselves
 
     Returns:
-       int: number of squares revealed
+       int: number of squares revealed, or, if delta is True, the list of
+       (coordinates, string) pairs of the revealed squares, in the order
+       they were revealed, with the strings render_nd shows for them
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 3), delta=True)
+    [((0, 3), ' '), ((0, 2), '1'), ((1, 2), '1'), ((1, 3), ' ')]
 
     >>> g = {'dimensions': (2, 4, 2),
     ...      'board': [[[3, '.'], [3, 3], [1, 1], [0, 0]],
@@ -512,24 +2051,236 @@ def dig_nd(game, coordinates):
     state: defeat
     """
 
-    if game["state"] != "ongoing" or not get_value(game["hidden"], coordinates):
-        return 0
-    replace_value(game["hidden"], coordinates, False)
-    # bomb
-    if get_value(game["board"], coordinates) == ".":
-        game["state"] = "defeat"
-        return 1
-    # 0:
+    return dig_many(game, [coordinates], delta)
+
+
+def playing_board(game):
+    """
+    Returns the board digs on a game are made on: the game itself, unless
+    it is a legacy game, which is converted with flat_game (see
+    finish_digs).
+
+    >>> g = new_sparse_game((1, 3), [(0, 0)])
+    >>> playing_board(g) is g
+    True
+    """
+    if "bombs" in game or "bomb_rows" in game:
+        return game
+    return flat_game(game)
+
+
+def dig_board(board, index):
+    """
+    Dig up the cell at the given flat index of a flat, sparse or bitboard
+    game, and returns the list of flat indices that were revealed.
+
+    Flagged squares are left alone: digging one does nothing, and the
+    engines do not spread openings to them.
+
+    >>> dig_board(new_bitboard_2d(1, 3, [(0, 0)]), 2)
+    [2, 1]
+    """
+    if board.get("flag_count") and flag_marks(board, [index])[0]:
+        return []
+    return dig_board_cells(board, index)
+
+
+def dig_board_cells(board, index):
+    """
+    Dig up the cell at the given flat index of a flat, sparse or bitboard
+    game with the engine of its form, even if that cell is flagged (see
+    dig_board).
+
+    >>> dig_board_cells(new_sparse_game((1, 3), [(0, 0)]), 2)
+    [2, 1]
+    """
+    if "bombs" in board:
+        return dig_sparse(board, index)
+    if "bomb_rows" in board:
+        return dig_bitboard(board, index)
+    return dig_flat(board, index)
+
+
+def finish_digs(game, board, revealed, delta):
+    """
+    Completes digs made on the playing board of a game: copies what they
+    revealed and the new state back to legacy games, increases the game's
+    version if anything was revealed, and returns the result of the digs as
+    dig_nd does.
+
+    >>> g = new_game_2d(1, 3, [(0, 0)])
+    >>> board = playing_board(g)
+    >>> finish_digs(g, board, dig_board(board, 2), True)
+    [((0, 2), ' '), ((0, 1), '1')]
+    >>> g['hidden']
+    [[True, False, False]]
+    """
+    if board is not game:
+        for index in revealed:
+            replace_value(
+                game["hidden"], flat_coordinates(index, board["dimensions"]), False
+            )
+        game["state"] = board["state"]
+    if revealed and "version" in game:
+        game["version"] += 1
+    if delta:
+        return revealed_cells(board, revealed)
+    return len(revealed)
+
+
+def dig_many(game, coordinates, delta=False):
+    """
+    Dig up every square of a list of coordinates, in order, as dig_nd does
+    for each of them.  Squares already revealed are skipped, and the digs
+    stop as soon as the game is over.  Legacy games are converted to the
+    flat form only once for all the digs.  If any of the coordinates is off
+    the board, IndexError is raised before anything is dug.
+
+    Args:
+       coordinates (list): The coordinates of the squares to dig up
+       delta (bool): Whether to return the revealed squares themselves
+
+    Returns:
+       int: number of squares revealed by all the digs, or, if delta is
+       True, the list of (coordinates, string) pairs of the revealed
+       squares (see dig_nd)
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_many(g, [(0, 3), (0, 2), (0, 1)], delta=True)
+    [((0, 3), ' '), ((0, 2), '1'), ((1, 2), '1'), ((1, 3), ' '), ((0, 1), '3')]
+    >>> g['state']
+    'victory'
+    """
+    if game["state"] != "ongoing":
+        return [] if delta else 0
+    board = playing_board(game)
+    dimensions = board["dimensions"]
+    strides = board["strides"]
+    # every coordinate is checked before any dig changes the game
+    indices = [
+        checked_index(coordinate, dimensions, strides) for coordinate in coordinates
+    ]
+    revealed = []
+    for index in indices:
+        if board["state"] != "ongoing":
+            break
+        revealed.extend(dig_board(board, index))
+    return finish_digs(game, board, revealed, delta)
+
+
+def chord_nd(game, coordinates, flagged=None, delta=False):
+    """
+    Chord on a revealed, numbered square: if exactly as many of its hidden
+    neighbors are flagged as its number says, dig up all of its other
+    hidden neighbors (see dig_many).  Otherwise, nothing happens.
+
+    Args:
+       coordinates (tuple): The square to chord on
+       flagged (list): The coordinates of the squares the player flagged,
+                       if not the squares flagged in the game (see flag_nd)
+       delta (bool): Whether to return the revealed squares themselves
+
+    Returns:
+       The result of the digs, as in dig_many
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> dig_nd(g, (0, 1))
+    1
+    >>> chord_nd(g, (0, 1), [(0, 0), (1, 0)])
+    0
+    >>> chord_nd(g, (0, 1), [(0, 0), (1, 0), (1, 1)], delta=True)
+    [((0, 2), '1'), ((1, 2), '1')]
+    """
+    if game["state"] != "ongoing":
+        return [] if delta else 0
+    board = playing_board(game)
+    dimensions = board["dimensions"]
+    strides = board["strides"]
+    index = checked_index(coordinates, dimensions, strides)
+    count = cell_values(board, [index])[0]
+    revealed = []
+    if count > 0 and not hidden_flags(board, [index])[0]:
+        if flagged is None:
+            flagged = set(flagged_indices(board))
+        else:
+            flagged = {
+                checked_index(coordinate, dimensions, strides) for coordinate in flagged
+            }
+        around = neighbor_indices(index, dimensions, strides)
+        hidden = [
+            neighbor
+            for neighbor, is_hidden in zip(around, hidden_flags(board, around))
+            if is_hidden
+        ]
+        if sum(neighbor in flagged for neighbor in hidden) == count:
+            for neighbor in hidden:
+                if neighbor not in flagged and board["state"] == "ongoing":
+                    revealed.extend(dig_board(board, neighbor))
+    return finish_digs(game, board, revealed, delta)
+
+
+def flag_nd(game, coordinates, flag=True):
+    """
+    Flag (or, if flag is False, unflag) the hidden square at coordinates.
+    Returns True if this changed the game, and False if the square was
+    already flagged (or unflagged), is not hidden, or the game is over.
+
+    The game's 'flag_count' is kept up to date, and its version is
+    increased on every change.
+
+    Args:
+       coordinates (tuple): The square to flag
+       flag (bool): Whether to flag or to unflag the square
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)])
+    >>> flag_nd(g, (1, 0)), flag_nd(g, (1, 0)), g['flag_count']
+    (True, False, 1)
+    >>> dig_nd(g, (1, 0)), dig_nd(g, (0, 3))
+    (0, 4)
+    >>> render_nd(g)
+    [['_', '_', '1', ' '], ['F', '_', '1', ' ']]
+    >>> flag_nd(g, (0, 3)), flag_nd(g, (1, 0), False), g['flag_count']
+    (False, True, 0)
+    """
+    if game["state"] != "ongoing":
+        return False
+    if "board" in game:
+        dimensions = tuple(game["dimensions"])
+        strides = strides_of(dimensions)
     else:
-        revealed = reveal_square(game, coordinates)
-        # result=1
-        # if get_value(game["board"],coordinates) == 0:
-        #     all_neighbors = neighbors(coordinates, game["dimensions"])
-        #     for neighbor in all_neighbors:
-        #         result += dig_nd(game, neighbor)
-        if victory_check(game):
-            game["state"] = "victory"
-        return revealed
+        dimensions = game["dimensions"]
+        strides = game["strides"]
+    index = checked_index(coordinates, dimensions, strides)
+    if "board" in game:
+        hidden = get_value(game["hidden"], coordinates)
+    else:
+        hidden = hidden_flags(game, [index])[0]
+    size = strides[0] * dimensions[0]
+    if not hidden or flag_marks(game, [index])[0] == flag:
+        return False
+
+    if "flag_count" not in game:
+        if "bomb_rows" in game:
+            game["flag_rows"] = [0] * dimensions[0]
+        elif "bombs" in game:
+            game["flags"] = set()
+        else:
+            game["flags"] = flag_bytes((), size)
+        game["flag_count"] = 0
+    if "bomb_rows" in game:
+        row, col = divmod(index, dimensions[1])
+        game["flag_rows"][row] ^= 1 << col
+    elif "bombs" in game:
+        if flag:
+            game["flags"].add(index)
+        else:
+            game["flags"].discard(index)
+    else:
+        game["flags"][index >> 3] ^= 1 << (index & 7)
+    game["flag_count"] += 1 if flag else -1
+    if "version" in game:
+        game["version"] += 1
+    return True
 
 
 def reveal_square(game, coordinates):
@@ -547,14 +2298,23 @@ def reveal_square(game, coordinates):
     >>> reveal_square(g,(0,0,0))
     1
     """
-    result = 1
-    if get_value(game["board"], coordinates) == 0:
-        all_neighbors = neighbors(coordinates, game["dimensions"])
-        for neighbor in all_neighbors:
-            if get_value(game["hidden"], neighbor):
-                replace_value(game["hidden"], neighbor, False)
-                result += reveal_square(game, neighbor)
-    return result
+    revealed = []
+    if "bombs" in game or "bomb_rows" in game:
+        index = checked_index(coordinates, game["dimensions"], game["strides"])
+        if "bombs" in game:
+            reveal_sparse(game, index, revealed)
+        else:
+            reveal_bitboard(game, index, revealed)
+        return len(revealed) + 1
+    flat = flat_game(game)
+    index = checked_index(coordinates, flat["dimensions"], flat["strides"])
+    reveal_flat(flat, index, revealed)
+    if flat is not game:
+        for index in revealed:
+            replace_value(
+                game["hidden"], flat_coordinates(index, flat["dimensions"]), False
+            )
+    return len(revealed) + 1
 
 
 def victory_check(game):
@@ -572,17 +2332,9 @@ def victory_check(game):
     >>> victory_check(g)
     False
     """
-    hidden_square = 0
-    for coordinate in all_possible_coordinates(game["dimensions"]):
-        if (
-            get_value(game["hidden"], coordinate)
-            and get_value(game["board"], coordinate) != "."
-        ):
-            hidden_square += 1
-    if hidden_square > 0:
-        return False
-    else:
-        return True
+    if "bombs" in game or "bomb_rows" in game:
+        return game["hidden_safe"] == 0
+    return hidden_safe_cells(flat_game(game)) == 0
 
 
 def render_nd(game, xray=False):
@@ -618,17 +2370,197 @@ def render_nd(game, xray=False):
     [[['3', '.'], ['3', '3'], ['1', '1'], [' ', ' ']],
     [['.', '3'], ['3', '.'], ['1', '1'], [' ', ' ']]]
     """
-    board = create_array(game["dimensions"], 0)
-    for coordinate in all_possible_coordinates(game["dimensions"]):
-        value = get_value(game["board"], coordinate)
-        replace_value(board, coordinate, str(value))
-        if value == 0:
-            replace_value(board, coordinate, " ")
-        if not xray:
-            if_hidden = get_value(game["hidden"], coordinate)
-            if if_hidden:
-                replace_value(board, coordinate, "_")
-    return board
+    if "bombs" in game:
+        return nest(render_sparse(game, xray), game["dimensions"])
+    if "bomb_rows" in game:
+        return render_bitboard(game, xray)
+    flat = flat_game(game)
+    return nest(render_flat(flat, xray), flat["dimensions"])
+
+
+def render_slice(game, coordinates, row_axis, col_axis, xray=False, window=None):
+    """
+    Prepare a 2-D slice of the game for display.
+
+    Returns a two-dimensional array (list of lists) of the same strings as
+    render_nd, for the cells whose coordinates match the given coordinates
+    on every axis but row_axis and col_axis; those two axes are laid out as
+    the rows and columns of the result.  If row_axis and col_axis are the
+    same axis, the slice is a single row along it.  Only the cells in the
+    slice are looked at, so this is much cheaper than render_nd on large
+    boards.  Sparse and bitboard games are rendered without converting
+    them.
+
+    Args:
+       coordinates (tuple): A coordinate on every axis (the values on
+                            row_axis and col_axis are ignored)
+       row_axis (int): The axis laid out as rows
+       col_axis (int): The axis laid out as columns
+       xray (bool): Whether to reveal all tiles or just the ones allowed by
+                    game['hidden']
+       window (tuple): Optional ((row_start, row_stop), (col_start,
+                       col_stop)) ranges limiting the rows and columns
+                       returned
+
+    Returns:
+       A 2D array (list of lists)
+
+    >>> g = new_game_nd((2, 4, 2), [(0, 0, 1), (1, 0, 0), (1, 1, 1)])
+    >>> render_slice(g, (0, 0, 0), 1, 2, True)
+    [['3', '.'], ['3', '3'], ['1', '1'], [' ', ' ']]
+    >>> render_slice(g, (0, 0, 1), 0, 1, True, window=((0, 2), (1, 3)))
+    [['3', '1'], ['.', '1']]
+    >>> render_slice(g, (1, 0, 0), 2, 2)
+    [['_', '_']]
+    """
+    board = game if "bombs" in game or "bomb_rows" in game else flat_game(game)
+    dimensions = board["dimensions"]
+    strides = board["strides"]
+    corner = list(coordinates)
+    corner[row_axis] = corner[col_axis] = 0
+    if row_axis == col_axis:
+        rows = (0, 1)
+    else:
+        rows = (0, dimensions[row_axis])
+    cols = (0, dimensions[col_axis])
+    if window is not None:
+        rows = (max(window[0][0], rows[0]), min(window[0][1], rows[1]))
+        cols = (max(window[1][0], cols[0]), min(window[1][1], cols[1]))
+
+    row_stride = strides[row_axis]
+    col_stride = strides[col_axis]
+    start = checked_index(corner, dimensions, strides) + cols[0] * col_stride
+    stop = start + (cols[1] - cols[0]) * col_stride
+    rendered = []
+    for row in range(*rows):
+        offset = row * row_stride
+        indices = range(start + offset, stop + offset, col_stride)
+        if "cells" in board:
+            values = board["cells"][start + offset : stop + offset : col_stride]
+            hidden = board["mask"][start + offset : stop + offset : col_stride]
+        else:
+            values = cell_values(board, indices)
+            hidden = hidden_flags(board, indices)
+        symbols = cell_symbols(values)
+        if xray:
+            rendered.append([symbols[value] for value in values])
+        else:
+            row_strings = [
+                "_" if is_hidden else symbols[value]
+                for value, is_hidden in zip(values, hidden)
+            ]
+            rendered.append(overlay_flags(board, row_strings, indices))
+    return rendered
+
+
+def render_rows(game, xray=False):
+    """
+    Yields the same strings as render_nd, one row at a time: the rows along
+    the last axis, in row-major order.
+
+    Only one row is built at a time (see render_slice), so, apart from
+    legacy games, which are converted to the flat form first, the memory
+    this takes does not grow with the size of the board.
+
+    Args:
+       xray (bool): Whether to reveal all tiles or just the ones allowed by
+                    game['hidden']
+
+    >>> g = new_game_nd((2, 2, 3), [(0, 0, 0)], legacy=False)
+    >>> for row in render_rows(g, True):
+    ...     print(row)
+    ['.', '1', ' ']
+    ['1', '1', ' ']
+    ['1', '1', ' ']
+    ['1', '1', ' ']
+    """
+    board = flat_game(game) if "board" in game else game
+    dimensions = tuple(board["dimensions"])
+    if 0 in dimensions:
+        return
+    if "bomb_rows" in board:
+        for row in range(dimensions[0]):
+            yield render_bitboard_row(board, row, xray)
+        return
+    last = len(dimensions) - 1
+    size = board["strides"][0] * dimensions[0]
+    for start in range(0, size, dimensions[-1]):
+        corner = flat_coordinates(start, dimensions)
+        yield render_slice(board, corner, last, last, xray)[0]
+
+
+def render_2d_lines(game, xray=False):
+    """
+    Yields the lines of render_2d_board(game, xray), one at a time (without
+    line breaks).
+
+    >>> list(render_2d_lines(new_game_2d(2, 3, [(0, 0)]), True))
+    ['.1 ', '11 ']
+    """
+    for row in render_rows(game, xray):
+        yield "".join(row)
+
+
+def board_lines(game, xray=False):
+    """
+    Yields the lines of the ASCII art of a game of any dimension (see
+    render_nd_board), one at a time.
+
+    >>> list(board_lines(new_game_nd((2, 1, 3), [(0, 0, 0)]), True))
+    ['(0, :, :)', '.1 ', '', '(1, :, :)', '11 ']
+    """
+    dimensions = tuple(game["dimensions"])
+    if len(dimensions) <= 2:
+        yield from render_2d_lines(game, xray)
+        return
+    leading = dimensions[:-2]
+    slice_rows = dimensions[-2]
+    for number, line in enumerate(render_2d_lines(game, xray)):
+        if number % slice_rows == 0:
+            if number:
+                yield ""
+            corner = flat_coordinates(number // slice_rows, leading)
+            yield "(" + ", ".join([str(value) for value in corner] + [":", ":"]) + ")"
+        yield line
+
+
+def render_nd_board(game, xray=False):
+    """
+    Render a game of any dimension as ASCII art.
+
+    2-D games are rendered as in render_2d_board.  Games with more axes are
+    laid out as the 2-D slices along their last two axes, in row-major
+    order, each one under a line giving its coordinates on the other axes
+    and separated by blank lines.
+
+    >>> print(render_nd_board(new_game_nd((2, 2, 2), [(0, 0, 0)])))
+    (0, :, :)
+    __
+    __
+    <BLANKLINE>
+    (1, :, :)
+    __
+    __
+    """
+    return "\n".join(board_lines(game, xray))
+
+
+def write_board(game, file, xray=False):
+    """
+    Writes the ASCII art of a game of any dimension (the text of
+    render_nd_board) to a file-like object, a line at a time, so the whole
+    text is never held in memory.
+
+    >>> class Printer:
+    ...     def write(self, text):
+    ...         print(repr(text), end=' ')
+    >>> write_board(new_game_2d(2, 3, [(0, 0)]), Printer(), True)
+    '.1 ' '\\n' '11 '
+    """
+    for number, line in enumerate(board_lines(game, xray)):
+        if number:
+            file.write("\n")
+        file.write(line)
 
 
 if __name__ == "__main__":
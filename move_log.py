@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Event-sourced move log of a game.
+
+A MoveLog starts a game and then makes every move on it (digs, chords and
+flags) through its own methods, appending each move to a log.  Every
+snapshot_every moves it also stores a snapshot of the fields of the game
+that moves change (hidden cells, flags, state and counters), packed one bit
+per cell.  Boards are never stored: replaying the move that started the game
+rebuilds them.
+
+The game as it was after any number of moves is restored by rebuilding the
+board, loading the nearest snapshot at or before that move and replaying
+the moves after it, so a restore never replays more than snapshot_every
+moves however long the game has run.  This gives undo and, when the log is
+also written to a stream as JSON lines, crash recovery (see MoveLog.load).
+"""
+
+import json
+import base64
+
+import main
+
+# the functions that can start a logged game
+CONSTRUCTORS = ("new_game_nd", "new_game_2d", "new_sparse_game", "new_bitboard_2d")
+
+# the fields that moves change, for every form of game
+MUTABLE_FIELDS = (
+    "mask",
+    "hidden",
+    "revealed",
+    "hidden_rows",
+    "flags",
+    "flag_rows",
+    "flag_count",
+    "state",
+    "hidden_safe",
+    "version",
+)
+
+BITS_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+DIGITS_TO_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def pack_mask(mask):
+    """
+    Packs a sequence of 0s and 1s into bytes holding one per bit, the first
+    in the lowest bit of the first byte.
+
+    >>> pack_mask(bytearray([1, 0, 1, 1, 0, 0, 0, 0, 1]))
+    b'\\r\\x01'
+    """
+    if not mask:
+        return b""
+    bits = int(bytes(mask).translate(BITS_TO_DIGITS)[::-1], 2)
+    return bits.to_bytes((len(mask) + 7) // 8, "little")
+
+
+def unpack_mask(packed, size):
+    """
+    Unpacks the first size bits of bytes made by pack_mask into a bytearray
+    of 0s and 1s.
+
+    >>> list(unpack_mask(b'\\r\\x01', 9))
+    [1, 0, 1, 1, 0, 0, 0, 0, 1]
+    """
+    if not size:
+        return bytearray()
+    digits = format(int.from_bytes(packed, "little"), "0%db" % size)
+    return bytearray(digits[::-1][:size].encode("ascii").translate(DIGITS_TO_BITS))
+
+
+def game_size(game):
+    """
+    Returns the number of cells of a game.
+
+    >>> game_size(main.new_game_2d(2, 3, []))
+    6
+    """
+    dimensions = tuple(game["dimensions"])
+    return main.strides_of(dimensions)[0] * dimensions[0]
+
+
+def snapshot(game):
+    """
+    Returns a compact copy of the fields of a game that moves change.
+    Hidden cells are packed one bit per cell, the nested 'hidden' lists of
+    legacy games included.
+
+    >>> snapshot(main.new_game_nd((1, 3), [(0, 0)], legacy=False))
+    {'mask': b'\\x07', 'state': 'ongoing', 'hidden_safe': 2, 'version': 0}
+    """
+    fields = {}
+    for key in MUTABLE_FIELDS:
+        if key not in game:
+            continue
+        value = game[key]
+        if key == "mask":
+            value = pack_mask(value)
+        elif key == "hidden":
+            dimensions = tuple(game["dimensions"])
+            value = pack_mask(bytes(main.flatten(value, dimensions)))
+        elif isinstance(value, (bytearray, set, list)):
+            value = type(value)(value)
+        fields[key] = value
+    return fields
+
+
+def load_snapshot(game, fields):
+    """
+    Overwrites the fields of a game that moves change with those of a
+    snapshot (see snapshot), leaving the snapshot untouched.
+    """
+    for key, value in fields.items():
+        if key == "mask":
+            value = unpack_mask(value, game_size(game))
+        elif key == "hidden":
+            hidden = map(bool, unpack_mask(value, game_size(game)))
+            value = main.nest(list(hidden), tuple(game["dimensions"]))
+        elif isinstance(value, (bytearray, set, list)):
+            value = type(value)(value)
+        game[key] = value
+
+
+def encode(value):
+    """
+    Returns a JSON-serializable form of a move or a snapshot.
+
+    >>> encode({'mask': b'\\x07', 'revealed': {3, 1}, 'at': (0, 1)})
+    {'mask': {'bytes': 'Bw=='}, 'revealed': {'set': [1, 3]}, 'at': [0, 1]}
+    """
+    if isinstance(value, bytes):
+        return {"bytes": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, bytearray):
+        return {"bytearray": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, set):
+        return {"set": sorted(value)}
+    if isinstance(value, dict):
+        return {key: encode(inner) for key, inner in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(inner) for inner in value]
+    return value
+
+
+def decode(value):
+    """
+    Inverts encode, reading JSON arrays back as tuples.
+
+    >>> decode({'mask': {'bytes': 'Bw=='}, 'revealed': {'set': [1, 3]},
+    ...         'at': [0, 1]})
+    {'mask': b'\\x07', 'revealed': {1, 3}, 'at': (0, 1)}
+    """
+    if isinstance(value, dict):
+        if value.keys() == {"bytes"}:
+            return base64.b64decode(value["bytes"])
+        if value.keys() == {"bytearray"}:
+            return bytearray(base64.b64decode(value["bytearray"]))
+        if value.keys() == {"set"}:
+            return set(value["set"])
+        return {key: decode(inner) for key, inner in value.items()}
+    if isinstance(value, list):
+        return tuple(decode(inner) for inner in value)
+    return value
+
+
+def apply_move(game, move, delta=False, engine=main):
+    """
+    Makes a logged move on a game, with the functions of the engine module,
+    and returns what the underlying function returns.  Moves are tuples
+    naming the move followed by its arguments: ('dig', coordinates),
+    ('dig_many', [coordinates, ...]), ('chord', coordinates, flagged) and
+    ('flag', coordinates, flag).
+
+    >>> g = main.new_game_nd((1, 3), [(0, 0)], legacy=False)
+    >>> apply_move(g, ('flag', (0, 0), True)), apply_move(g, ('dig', (0, 2)))
+    (True, 2)
+    """
+    kind = move[0]
+    if kind == "dig":
+        return engine.dig_nd(game, tuple(move[1]), delta)
+    if kind == "dig_many":
+        return engine.dig_many(game, [tuple(i) for i in move[1]], delta)
+    if kind == "chord":
+        flagged = move[2]
+        if flagged is not None:
+            flagged = [tuple(i) for i in flagged]
+        return engine.chord_nd(game, tuple(move[1]), flagged, delta)
+    if kind == "flag":
+        return engine.flag_nd(game, tuple(move[1]), move[2])
+    raise ValueError("unknown move %r" % (kind,))
+
+
+class MoveLog:
+    """
+    A game together with the append-only log of the moves made on it.
+
+    >>> log = MoveLog('new_game_nd', (2, 4), [(0, 0), (1, 0), (1, 1)],
+    ...               legacy=False, snapshot_every=2)
+    >>> log.flag((0, 0)), log.dig((1, 3)), log.dig((0, 1))
+    (True, 4, 1)
+    >>> len(log), sorted(log.snapshots)
+    (3, [2])
+    >>> main.render_nd(log.restore(1))
+    [['F', '_', '_', '_'], ['_', '_', '_', '_']]
+    >>> log.undo()
+    >>> main.render_nd(log.game), len(log)
+    ([['F', '_', '1', ' '], ['_', '_', '1', ' ']], 2)
+    """
+
+    def __init__(
+        self,
+        constructor,
+        *args,
+        snapshot_every=64,
+        stream=None,
+        engine=main,
+        **kwargs,
+    ):
+        if constructor not in CONSTRUCTORS:
+            raise ValueError("unknown constructor %r" % (constructor,))
+        self.engine = engine
+        self.start = (constructor, args, kwargs)
+        self.snapshot_every = snapshot_every
+        self.stream = stream
+        self.moves = []
+        # number of moves made -> snapshot of the game after them
+        self.snapshots = {}
+        self.game = self.new_game()
+        self.write(self.header())
+
+    def __len__(self):
+        """
+        Returns the number of moves made.
+        """
+        return len(self.moves)
+
+    def new_game(self):
+        """
+        Returns a new game, as started by the first entry of the log.
+        """
+        constructor, args, kwargs = self.start
+        return getattr(self.engine, constructor)(*args, **kwargs)
+
+    def header(self):
+        """
+        Returns the first entry of the log, which starts the game.
+        """
+        constructor, args, kwargs = self.start
+        return {
+            "new": constructor,
+            "args": args,
+            "kwargs": kwargs,
+            "snapshot_every": self.snapshot_every,
+        }
+
+    def lines(self):
+        """
+        Yields the JSON lines of a stream holding the log as it is now, from
+        which MoveLog.load rebuilds it (undone moves left out).
+        """
+        entries = [self.header()]
+        if 0 in self.snapshots:
+            entries.append({"snapshot": 0, "fields": self.snapshots[0]})
+        for entry in entries:
+            yield json.dumps(encode(entry)) + "\n"
+        for number, move in enumerate(self.moves, 1):
+            yield json.dumps(encode({"move": move})) + "\n"
+            if number in self.snapshots:
+                entry = {"snapshot": number, "fields": self.snapshots[number]}
+                yield json.dumps(encode(entry)) + "\n"
+
+    def write(self, *entries):
+        """
+        Appends entries to the stream of the log, if it has one.
+        """
+        if self.stream is not None:
+            for entry in entries:
+                self.stream.write(json.dumps(encode(entry)) + "\n")
+            self.stream.flush()
+
+    def play(self, move, delta=False):
+        """
+        Makes a move on the game, appends it to the log (and a snapshot, when
+        one is due) and returns what the move returns.
+        """
+        result = apply_move(self.game, move, delta, self.engine)
+        self.moves.append(move)
+        entries = [{"move": move}]
+        if len(self.moves) % self.snapshot_every == 0:
+            fields = snapshot(self.game)
+            self.snapshots[len(self.moves)] = fields
+            entries.append({"snapshot": len(self.moves), "fields": fields})
+        self.write(*entries)
+        return result
+
+    def dig(self, coordinates, delta=False):
+        """
+        Digs a cell (see main.dig_nd).
+        """
+        return self.play(("dig", tuple(coordinates)), delta)
+
+    def dig_many(self, coordinates, delta=False):
+        """
+        Digs several cells at once (see main.dig_many).
+        """
+        return self.play(("dig_many", tuple(tuple(i) for i in coordinates)), delta)
+
+    def chord(self, coordinates, flagged=None, delta=False):
+        """
+        Chords on a revealed cell (see main.chord_nd).
+        """
+        if flagged is not None:
+            flagged = tuple(tuple(i) for i in flagged)
+        return self.play(("chord", tuple(coordinates), flagged), delta)
+
+    def flag(self, coordinates, flag=True):
+        """
+        Flags or unflags a cell (see main.flag_nd).
+        """
+        return self.play(("flag", tuple(coordinates), flag))
+
+    def restore(self, moves=None):
+        """
+        Returns a new game as it was after the given number of moves (all of
+        them if None), replaying the moves after the nearest snapshot.
+        """
+        if moves is None:
+            moves = len(self.moves)
+        if not 0 <= moves <= len(self.moves):
+            raise IndexError("no move %r in a log of %d" % (moves, len(self.moves)))
+        game = self.new_game()
+        start = max((number for number in self.snapshots if number <= moves), default=0)
+        if start in self.snapshots:
+            load_snapshot(game, self.snapshots[start])
+        for move in self.moves[start:moves]:
+            apply_move(game, move, engine=self.engine)
+        return game
+
+    def undo(self, count=1):
+        """
+        Takes back the last count moves, dropping them from the log.
+
+        The version of the restored game is moved past that of the current
+        one, so renders cached under an earlier version are not reused; a
+        snapshot taken there keeps later restores in step with it.
+        """
+        moves = max(len(self.moves) - count, 0)
+        game = self.restore(moves)
+        if "version" in game:
+            game["version"] = self.game["version"] + 1
+        self.truncate(moves)
+        self.snapshots[moves] = fields = snapshot(game)
+        self.write({"undo": moves}, {"snapshot": moves, "fields": fields})
+        self.game = game
+
+    def truncate(self, moves):
+        """
+        Drops the moves after the given number, and their snapshots.
+        """
+        del self.moves[moves:]
+        for number in [number for number in self.snapshots if number > moves]:
+            del self.snapshots[number]
+
+    @classmethod
+    def load(cls, lines, stream=None, engine=main):
+        """
+        Rebuilds a log, and its current game, from the JSON lines written to
+        the stream of a MoveLog (for instance after a crash).  A last line
+        cut short by the crash is ignored.  New entries go to stream.
+        """
+        log = None
+        for line in lines:
+            try:
+                entry = decode(json.loads(line))
+            except ValueError:
+                break
+            if "new" in entry:
+                if entry["new"] not in CONSTRUCTORS:
+                    raise ValueError("unknown constructor %r" % (entry["new"],))
+                log = cls.__new__(cls)
+                log.engine = engine
+                log.start = (entry["new"], entry["args"], entry["kwargs"])
+                log.snapshot_every = entry["snapshot_every"]
+                log.stream = None
+                log.moves = []
+                log.snapshots = {}
+            elif "move" in entry:
+                log.moves.append(entry["move"])
+            elif "snapshot" in entry:
+                fields = entry["fields"]
+                for key, value in fields.items():
+                    if isinstance(value, tuple):
+                        fields[key] = list(value)
+                log.snapshots[entry["snapshot"]] = fields
+            elif "undo" in entry:
+                log.truncate(entry["undo"])
+        if log is None:
+            raise ValueError("the log does not start a game")
+        log.game = log.restore()
+        log.stream = stream
+        return log
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Optional NumPy backend for main.py.
+
+Provides vectorized versions of the functions that touch every cell of a
+board: building the neighbor counts, rendering and checking for victory.
+They take and return the same game dictionaries as main.py, so games can be
+passed freely between the two modules.  When NumPy is not installed, every
+function here falls back to the pure-Python implementation in main.py.
+"""
+
+import main
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback
+    np = None
+
+
+def bomb_counts(dimensions, bombs):
+    """
+    Returns the flat cells of a board with the given bombs (see
+    main.bomb_counts), summing an int8 bomb mask over a 3-wide window along
+    each axis.
+
+    >>> bomb_counts((2, 4), [(0, 0), (1, 0), (1, 1)])
+    [-1, 3, 1, 0, -1, -1, 1, 0]
+    """
+    shape = tuple(dimensions)
+    if np is None:
+        return main.bomb_counts(shape, main.strides_of(shape), bombs)
+
+    bombs = list(bombs)
+    mask = np.zeros(shape, dtype=np.int8)
+    if bombs:
+        np.add.at(mask, tuple(np.array(bombs, dtype=np.intp).T), 1)
+
+    sums = mask.astype(np.int32)
+    for axis in range(len(shape)):
+        padding = [(0, 0)] * len(shape)
+        padding[axis] = (1, 1)
+        padded = np.pad(sums, padding)
+        sums = (
+            padded.take(range(0, shape[axis]), axis=axis)
+            + padded.take(range(1, shape[axis] + 1), axis=axis)
+            + padded.take(range(2, shape[axis] + 2), axis=axis)
+        )
+    return np.where(mask > 0, main.BOMB, sums).ravel().tolist()
+
+
+def new_game_nd(dimensions, bombs, legacy=True):
+    """
+    Start a new game, like main.new_game_nd, building the neighbor counts
+    with bomb_counts.
+
+    >>> main.dump(new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)]))
+    board:
+        ['.', 3, 1, 0]
+        ['.', '.', 1, 0]
+    dimensions: (2, 4)
+    hidden:
+        [True, True, True, True]
+        [True, True, True, True]
+    state: ongoing
+    """
+    shape = tuple(dimensions)
+    strides = main.strides_of(shape)
+    size = strides[0] * shape[0]
+    cells = bomb_counts(shape, bombs)
+
+    game = main.Game(
+        dimensions=shape,
+        strides=strides,
+        cells=cells,
+        mask=bytearray(b"\x01") * size,
+        state="ongoing",
+        hidden_safe=size - cells.count(main.BOMB),
+        version=0,
+    )
+    if legacy:
+        game = main.legacy_game(game)
+        game["dimensions"] = dimensions
+    return game
+
+
+def new_game_2d(num_rows, num_cols, bombs, legacy=True):
+    """
+    Start a new 2-D game (see new_game_nd).
+
+    >>> new_game_2d(1, 3, [(0, 0)])['board']
+    [['.', 1, 0]]
+    """
+    return new_game_nd((num_rows, num_cols), bombs, legacy)
+
+
+def hidden_safe_cells(game):
+    """
+    Returns how many safe cells of a game are still hidden, like
+    main.hidden_safe_cells.  Games that do not carry the counter are counted
+    with a single masked reduction over arrays built straight from their
+    cells: the nested 'board' and 'hidden' lists of legacy games, or the
+    'cells' and 'mask' of flat games, which then keep the count.
+
+    >>> hidden_safe_cells({'dimensions': (1, 3), 'board': [['.', 1, 0]],
+    ...                    'hidden': [[True, False, True]],
+    ...                    'state': 'ongoing'})
+    1
+    """
+    if np is None or "hidden_safe" in game:
+        return main.hidden_safe_cells(game)
+    if "board" in game:
+        hidden = np.array(game["hidden"], dtype=bool)
+        bombs = np.array(game["board"], dtype=object) == "."
+        return int(np.count_nonzero(hidden & ~bombs))
+    if "cells" not in game:
+        return main.hidden_safe_cells(game)
+    cells = np.array(game["cells"], dtype=np.int32)
+    hidden = np.frombuffer(game["mask"], dtype=np.uint8).astype(bool)
+    game["hidden_safe"] = int(np.count_nonzero(hidden & (cells != main.BOMB)))
+    return game["hidden_safe"]
+
+
+def victory_check(game):
+    """
+    Returns True if the game is in a "victory" state False otherwise (see
+    main.victory_check).
+
+    >>> victory_check(new_game_nd((1, 3), [(0, 0)], legacy=False))
+    False
+    """
+    return hidden_safe_cells(game) == 0
+
+
+def render_nd(game, xray=False):
+    """
+    Prepare the game for display (see main.render_nd), looking every cell's
+    string up in a table indexed by its neighbor count.
+
+    >>> g = new_game_nd((2, 4), [(0, 0), (1, 0), (1, 1)], legacy=False)
+    >>> render_nd(g, True)
+    [['.', '3', '1', ' '], ['.', '.', '1', ' ']]
+    >>> main.dig_nd(g, (0, 3))
+    4
+    >>> render_nd(g)
+    [['_', '_', '1', ' '], ['_', '_', '1', ' ']]
+    """
+    if np is None:
+        return main.render_nd(game, xray)
+    flat = main.flat_game(game)
+    cells = np.array(flat["cells"], dtype=np.int32)
+    largest = int(cells.max()) if cells.size else 0
+    symbols = np.array(
+        [".", " "] + [str(count) for count in range(1, largest + 1)], dtype=object
+    )
+    rendered = symbols[cells - main.BOMB]
+    if not xray:
+        hidden = np.frombuffer(flat["mask"], dtype=np.uint8).astype(bool)
+        rendered[hidden] = "_"
+        rendered[main.flagged_indices(flat)] = "F"
+    return rendered.reshape(flat["dimensions"]).tolist()
+
+
+def render_2d_locations(game, xray=False):
+    """
+    Prepare a 2-D game for display (see render_nd).
+
+    >>> render_2d_locations(new_game_2d(1, 3, [(0, 0)]), True)
+    [['.', '1', ' ']]
+    """
+    return render_nd(game, xray)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Cache of the boards rendered by server_2d.py and server_nd.py.
+
+Every game carries a version number that dig_nd increases whenever it
+changes the board, so a render of a game is fully determined by the game's
+id, its version, whether it is an xray render and which slice of the board
+it shows.  Renders are cached under that key together with their JSON
+encoding: asking again for an unchanged board sends the stored bytes
+instead of rebuilding the nested lists, and a client that sends back the
+ETag of the response it already holds gets an empty 304 Not Modified.
+Renders of older versions are never looked up again; they fall off the end
+of the least-recently-used list.
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from static_cache import etag_matches
+
+
+def render_etag(key):
+    """
+    Returns the ETag of the render with the given (game id, version, ...)
+    key: the version, followed by a digest of the rest of the key.
+
+    >>> render_etag(('0123abcd', 7, False))
+    '"7-62da6bb2d94d412e"'
+    """
+    game_id, version, *rest = key
+    digest = hashlib.sha1(repr((game_id, rest)).encode("utf-8")).hexdigest()
+    return '"%d-%s"' % (version, digest[:16])
+
+
+class RenderCache:
+    """
+    Thread-safe LRU cache of renders, holding each render's result and the
+    bytes of its JSON encoding.
+
+    >>> cache = RenderCache()
+    >>> status, headers, body = cache.respond(('g', 0, False), {}, lambda: [['_']])
+    >>> status, body
+    ('200 OK', b'[["_"]]')
+    >>> cache.lookup(('g', 0, False))
+    ([['_']], b'[["_"]]')
+    >>> cache.respond(('g', 0, False), {'HTTP_IF_NONE_MATCH': dict(headers)['ETag']},
+    ...               lambda: 1 / 0)[0]
+    '304 NOT MODIFIED'
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        # key -> (result, JSON bytes), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def lookup(self, key):
+        """
+        Returns the (result, JSON bytes) stored for key, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key, result):
+        """
+        Stores a render under key and returns its (result, JSON bytes).
+        """
+        entry = (result, json.dumps(result).encode("utf-8"))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def respond(self, key, environ, render):
+        """
+        Returns the (status, headers, body) of the response to a render
+        request with the given key, calling render() only if the render is
+        neither held by the client nor cached.
+        """
+        etag = render_etag(key)
+        headers = [("Cache-Control", "no-cache"), ("ETag", etag)]
+        if etag_matches(etag, environ):
+            return "304 NOT MODIFIED", headers, b""
+        entry = self.lookup(key)
+        if entry is None:
+            entry = self.store(key, render())
+        body = entry[1]
+        headers = [
+            ("Content-type", "application/json"),
+            ("Content-length", str(len(body))),
+        ] + headers
+        return "200 OK", headers, body
@@ -5,14 +5,21 @@ import json
 import time
 import pickle
 import importlib
-import mimetypes
 
 from wsgiref.handlers import read_environ
-from wsgiref.simple_server import make_server
 
 import lab
+import async_server
+from move_log import MoveLog
+from render_cache import RenderCache
+from sqlite_store import SQLiteGameStore
+from static_cache import StaticAssets
+
+games = SQLiteGameStore(os.environ.get(
+    'GAMES_DB', os.path.join(os.path.dirname(__file__), 'games_nd.sqlite3')), engine=lab)
+renders = RenderCache()
+assets = StaticAssets(os.path.join(os.path.dirname(__file__), 'uind'))
 
-current_game_nd = None
 
 def parse_post(environ):
     try:
@@ -27,27 +34,79 @@ def parse_post(environ):
         return {}
 
 
-def handle_render_nd(params):
-    return lab.render_nd(current_game_nd, params['xray'])
+def handle_render_nd(params, environ):
+    with games.locked(params['game']) as log:
+        game = log.game
+        key = (params['game'], game['version'], params['xray'])
+        return renders.respond(key, environ, lambda: lab.render_nd(game, params['xray']))
+
+
+def handle_render_slice_nd(params, environ):
+    coordinates = tuple(params['coordinates'])
+    window = params.get('window')
+    if window is not None:
+        window = tuple(tuple(axis_range) for axis_range in window)
+    with games.locked(params['game']) as log:
+        game = log.game
+        key = (params['game'], game['version'], params['xray'], coordinates,
+               params['row_axis'], params['col_axis'], window)
+        return renders.respond(key, environ, lambda: lab.render_slice(
+            game, coordinates, params['row_axis'], params['col_axis'],
+            params['xray'], window))
 
 
 def handle_dig_nd(params):
-    dug_nd = lab.dig_nd(current_game_nd, tuple(params['coordinates']))
-    status = current_game_nd['state']
-    return [status, dug_nd]
+    with games.locked(params['game']) as log:
+        revealed = log.dig(params['coordinates'], delta=True)
+        status = log.game['state']
+    return [status, len(revealed), revealed]
+
+def handle_dig_many_nd(params):
+    with games.locked(params['game']) as log:
+        revealed = log.dig_many(params['coordinates'], delta=True)
+        status = log.game['state']
+    return [status, len(revealed), revealed]
+
+def handle_chord_nd(params):
+    flagged = params.get('flagged')
+    with games.locked(params['game']) as log:
+        revealed = log.chord(params['coordinates'], flagged, delta=True)
+        status = log.game['state']
+    return [status, len(revealed), revealed]
+
+def handle_flag_nd(params):
+    with games.locked(params['game']) as log:
+        changed = log.flag(params['coordinates'], params.get('flag', True))
+        return [log.game['state'], log.game.get('flag_count', 0), changed]
 
 def handle_new_game_nd(params):
-    global current_game_nd
-    current_game_nd = lab.new_game_nd(params['dimensions'], [tuple(i) for i in params['bombs']])
+    log = MoveLog('new_game_nd', tuple(params['dimensions']), [tuple(i) for i in params['bombs']],
+                  legacy=False, engine=lab)
+    return games.add(log)
+
+def handle_undo_nd(params):
+    with games.locked(params['game']) as log:
+        log.undo(params.get('count', 1))
+        return [log.game['state'], len(log)]
 
 def handle_restart(params):
-    # reload student code
-    importlib.reload(lab)
+    # reload student code, only when asked to: every UI page load calls this,
+    # and reloading swaps the engine under the games of every other session
+    if os.environ.get('RELOAD_LAB'):
+        importlib.reload(lab)
 
-funcs = {
+render_funcs = {
     '/ui_render_nd': handle_render_nd,
+    '/ui_render_nd_slice': handle_render_slice_nd,
+}
+
+funcs = {
     '/ui_dig_nd': handle_dig_nd,
+    '/ui_dig_many_nd': handle_dig_many_nd,
+    '/ui_chord_nd': handle_chord_nd,
+    '/ui_flag_nd': handle_flag_nd,
     '/ui_new_game_nd': handle_new_game_nd,
+    '/ui_undo_nd': handle_undo_nd,
     '/restart': handle_restart,
 }
 
@@ -55,6 +114,15 @@ funcs = {
 def application(environ, start_response):
     path = environ.get('PATH_INFO', '/') or '/'
     params = parse_post(environ)
+    if path in render_funcs:
+        try:
+            status, headers, body = render_funcs[path](params, environ)
+        except Exception as e:
+            status = '500 INTERNAL SERVER ERROR'
+            body = str(e).encode('utf-8')
+            headers = [('Content-type', 'text/plain'), ('Content-length', str(len(body)))]
+        start_response(status, headers)
+        return [body]
     if path in funcs:
         try:
             body = json.dumps(funcs[path](params)).encode('utf-8')
@@ -75,17 +143,16 @@ def application(environ, start_response):
         if static_file.startswith('uind/'):
             static_file = static_file[5:]
 
-        test_fname = os.path.join(os.path.dirname(__file__), 'uind', static_file)
+        response = assets.respond(static_file, environ)
+        if response is not None:
+            status, headers, body = response
+            start_response(status, headers)
+            return [body]
 
-        try:
-            status = '200 OK'
-            with open(test_fname, 'rb') as f:
-                body = f.read()
-            type_ = mimetypes.guess_type(test_fname)[0] or 'text/plain'
-        except FileNotFoundError:
-            status = '404 FILE NOT FOUND'
-            body = test_fname.encode('utf-8')
-            type_ = 'text/plain'
+        test_fname = os.path.join(os.path.dirname(__file__), 'uind', static_file)
+        status = '404 FILE NOT FOUND'
+        body = test_fname.encode('utf-8')
+        type_ = 'text/plain'
 
     len_ = str(len(body))
     headers = [('Content-type', type_), ('Content-length', len_)]
@@ -96,9 +163,9 @@ def application(environ, start_response):
 
 if __name__ == '__main__':
     print('starting server.  navigate to http://localhost:6101/')
-    with make_server('', 6101, application) as httpd:
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("Shutting down.")
-            httpd.server_close()
+    try:
+        async_server.serve(application, '', 6101)
+    except KeyboardInterrupt:
+        print("Shutting down.")
+    finally:
+        games.close()
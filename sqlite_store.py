@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed GameStore, so that games outlive the server process.
+
+Every game is a move_log.MoveLog, persisted as the JSON lines of its log: the
+move that started it, every move made since and the snapshots of its hidden
+cells and flags, packed one bit per cell.  Lines are queued as moves are made
+and written in batches, one transaction at a time, to a database in WAL mode:
+as soon as batch_size lines are queued, and otherwise by a background thread
+every flush_interval seconds, so no move waits longer than that to be written.
+
+The games in memory act as a cache in front of the database: a game evicted
+from it, or left behind by an earlier process, is rehydrated from its lines
+on the first request naming it, replaying at most snapshot_every moves.
+"""
+
+import time
+import sqlite3
+import threading
+import contextlib
+
+import main
+from game_store import GameStore
+from move_log import MoveLog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_lines (
+    game_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    PRIMARY KEY (game_id, seq)
+) WITHOUT ROWID
+"""
+
+
+class LogStream:
+    """
+    The stream a MoveLog held by a SQLiteGameStore writes its lines to.
+    """
+
+    def __init__(self, store, game_id, seq=0):
+        self.store = store
+        self.game_id = game_id
+        # the number of lines of the game already queued or written
+        self.seq = seq
+
+    def write(self, line):
+        """
+        Queues a line of the log for writing.
+        """
+        self.store.queue(self.game_id, self.seq, line)
+        self.seq += 1
+
+    def flush(self):
+        """
+        Writes the queued lines of every game if a batch is due.
+        """
+        self.store.flush(force=False)
+
+
+class SQLiteGameStore(GameStore):
+    """
+    GameStore of MoveLogs persisted in a SQLite database (see the module
+    docstring).  Games are rebuilt with the functions of the engine module.
+
+    >>> store = SQLiteGameStore(':memory:', max_games=1)
+    >>> first = store.add(MoveLog('new_game_nd', (1, 3), [(0, 0)], legacy=False))
+    >>> second = store.add(MoveLog('new_game_nd', (2, 2), [], legacy=False))
+    >>> first in store, len(store)
+    (True, 1)
+    >>> with store.locked(first) as log:
+    ...     log.dig((0, 2))
+    2
+    >>> store.flush()
+    >>> with store.locked(first) as log:
+    ...     main.render_nd(log.game)
+    [['_', '1', ' ']]
+    """
+
+    def __init__(
+        self,
+        filename,
+        max_games=1000,
+        ttl=3600,
+        clock=time.monotonic,
+        engine=main,
+        batch_size=256,
+        flush_interval=1.0,
+    ):
+        super().__init__(max_games, ttl, clock)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.connection = sqlite3.connect(
+            filename, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+        # (game id, seq, line) of the lines not written yet
+        self._pending = []
+        self._last_flush = clock()
+        self._db_lock = threading.Lock()
+        # game id -> lock held while the game is rehydrated
+        self._loading = {}
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def __contains__(self, game_id):
+        if super().__contains__(game_id):
+            return True
+        self.flush()
+        with self._db_lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM log_lines WHERE game_id = ? LIMIT 1", (game_id,)
+            ).fetchone()
+        return row is not None
+
+    def add(self, game, game_id=None):
+        """
+        Adds a MoveLog to the store, queueing its lines for writing, and
+        returns its id (see GameStore.add).
+        """
+        game_id = super().add(game, game_id)
+        self.delete_lines(game_id)
+        game.stream = LogStream(self, game_id)
+        for line in game.lines():
+            game.stream.write(line)
+        game.stream.flush()
+        return game_id
+
+    def remove(self, game_id):
+        """
+        Removes a game from the store and from the database.
+        """
+        super().remove(game_id)
+        self.delete_lines(game_id)
+
+    def delete_lines(self, game_id):
+        """
+        Deletes the lines of a game, queued or written.
+        """
+        with self._db_lock:
+            self._pending = [line for line in self._pending if line[0] != game_id]
+            self.connection.execute(
+                "DELETE FROM log_lines WHERE game_id = ?", (game_id,)
+            )
+
+    @contextlib.contextmanager
+    def locked(self, game_id):
+        """
+        Context manager holding the lock of the game with the given id and
+        yielding it, rehydrating it from the database if it is not in memory.
+        Raises KeyError if there is no such game.
+        """
+        if not super().__contains__(game_id):
+            self.rehydrate(game_id)
+        with super().locked(game_id) as game:
+            yield game
+
+    def rehydrate(self, game_id):
+        """
+        Rebuilds a game from its lines and puts it back in memory.  Raises
+        KeyError if the database has no lines for it.
+        """
+        with self._lock:
+            loading = self._loading.setdefault(game_id, threading.Lock())
+        try:
+            with loading:
+                if super().__contains__(game_id):
+                    return
+                self.flush()
+                with self._db_lock:
+                    lines = [
+                        line
+                        for (line,) in self.connection.execute(
+                            "SELECT line FROM log_lines WHERE game_id = ? ORDER BY seq",
+                            (game_id,),
+                        )
+                    ]
+                if not lines:
+                    raise KeyError(game_id)
+                stream = LogStream(self, game_id, len(lines))
+                log = MoveLog.load(lines, stream, self.engine)
+                GameStore.add(self, log, game_id)
+        finally:
+            with self._lock:
+                self._loading.pop(game_id, None)
+
+    def queue(self, game_id, seq, line):
+        """
+        Queues a line of the log of a game for writing.
+        """
+        with self._db_lock:
+            self._pending.append((game_id, seq, line))
+
+    def flush(self, force=True):
+        """
+        Writes the queued lines in one transaction; unless force is True,
+        only once batch_size lines are queued or flush_interval seconds have
+        passed since the last write.
+        """
+        with self._db_lock:
+            if not self._pending:
+                return
+            if not force and (
+                len(self._pending) < self.batch_size
+                and self.clock() - self._last_flush < self.flush_interval
+            ):
+                return
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO log_lines VALUES (?, ?, ?)", self._pending
+                )
+            self._pending = []
+            self._last_flush = self.clock()
+
+    def _flush_periodically(self):
+        """
+        Writes the queued lines every flush_interval seconds until the store
+        is closed.
+        """
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        Stops the background writes, writes the queued lines and closes the
+        database.
+        """
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        self.connection.close()
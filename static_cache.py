@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+In-memory cache of the static UI assets served by server_2d.py and
+server_nd.py.
+
+Every file of the UI directory is read once, at startup, together with a
+gzip-compressed copy (kept only when it is actually smaller), its MIME type,
+an ETag and a Last-Modified date.  Responses are then served from memory:
+compressed when the client sends Accept-Encoding: gzip, and as an empty
+304 Not Modified when the client already holds the current version.
+"""
+
+import os
+import gzip
+import hashlib
+import mimetypes
+import collections
+import email.utils
+
+Asset = collections.namedtuple(
+    "Asset", ["body", "gzipped", "content_type", "etag", "last_modified", "mtime"]
+)
+
+# compressed copies saving less than this fraction are not worth keeping
+MIN_GZIP_SAVING = 0.1
+
+
+def load_asset(filename):
+    """
+    Reads a file and returns its Asset.
+    """
+    with open(filename, "rb") as f:
+        body = f.read()
+    gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(gzipped) > (1 - MIN_GZIP_SAVING) * len(body):
+        gzipped = None
+    mtime = int(os.path.getmtime(filename))
+    return Asset(
+        body=body,
+        gzipped=gzipped,
+        content_type=mimetypes.guess_type(filename)[0] or "text/plain",
+        etag='"%s"' % hashlib.sha1(body).hexdigest(),
+        last_modified=email.utils.formatdate(mtime, usegmt=True),
+        mtime=mtime,
+    )
+
+
+def accepts_gzip(environ):
+    """
+    Returns True if the request's Accept-Encoding allows a gzip response.
+
+    >>> accepts_gzip({'HTTP_ACCEPT_ENCODING': 'gzip, deflate, br'})
+    True
+    >>> accepts_gzip({'HTTP_ACCEPT_ENCODING': 'gzip;q=0, deflate'})
+    False
+    >>> accepts_gzip({'HTTP_ACCEPT_ENCODING': 'gzip;q=high'})
+    False
+    >>> accepts_gzip({})
+    False
+    """
+    for coding in environ.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            quality = params.strip()
+            if not quality.startswith("q="):
+                return True
+            try:
+                return float(quality[2:] or 0) != 0
+            except ValueError:
+                # a malformed q-value counts as q=0
+                return False
+    return False
+
+
+def etag_matches(etag, environ):
+    """
+    Returns True if the request's If-None-Match header lists etag (weakly
+    compared) or "*".
+
+    >>> etag_matches('"v1"', {'HTTP_IF_NONE_MATCH': 'W/"v0", W/"v1"'})
+    True
+    >>> etag_matches('"v1"', {})
+    False
+    """
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return "*" in tags or etag in tags
+
+
+def not_modified(asset, etag, environ):
+    """
+    Returns True if the request's conditional headers show that the client
+    already holds this version of the asset.
+    """
+    if "HTTP_IF_NONE_MATCH" in environ:
+        return etag_matches(etag, environ)
+    if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since is not None:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return asset.mtime <= since.timestamp()
+    return False
+
+
+class StaticAssets:
+    """
+    The assets of one UI directory, keyed by their path relative to it
+    (with forward slashes).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.assets = {}
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                full_name = os.path.join(root, filename)
+                name = os.path.relpath(full_name, directory).replace(os.sep, "/")
+                self.assets[name] = load_asset(full_name)
+
+    def respond(self, name, environ):
+        """
+        Returns the (status, headers, body) of the response serving the
+        named asset, or None if there is no such asset.
+        """
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        body = asset.body
+        etag = asset.etag
+        headers = [
+            ("Content-type", asset.content_type),
+            ("Last-Modified", asset.last_modified),
+            ("Cache-Control", "no-cache"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if asset.gzipped is not None and accepts_gzip(environ):
+            body = asset.gzipped
+            etag = etag[:-1] + '-gzip"'
+            headers.append(("Content-Encoding", "gzip"))
+        headers.append(("ETag", etag))
+
+        if not_modified(asset, etag, environ):
+            return "304 NOT MODIFIED", headers[1:], b""
+        headers.append(("Content-length", str(len(body))))
+        return "200 OK", headers, body
@@ -1,15 +1,29 @@
 
 #!/usr/bin/env python3
+import io
 import os
 import sys
+import gzip
+import json
+import time
 import pickle
+import random
+import asyncio
+import threading
 import doctest
 
 import pytest
 
 import main
-
-sys.setrecursionlimit(20000)
+import async_server
+import bench
+import game_file
+import game_store
+import move_log
+import static_cache
+import render_cache
+import sqlite_store
+import numpy_backend
 
 TEST_DIRECTORY = os.path.dirname(__file__)
 
@@ -115,7 +129,7 @@ def test_newlargegame():
         else:
             assert result[name] == expected[name]
 
-def _do_test_2d_integration(test):
+def _do_test_2d_integration(test, new_game=main.new_game_2d):
     """ dig, render, and render_2d_board on boards """
     exp_fname = os.path.join(TEST_DIRECTORY, 'test_outputs', f'test2d_integration_{test:02d}.pickle')
     inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', f'test2d_integration_{test:02d}.pickle')
@@ -123,12 +137,13 @@ def _do_test_2d_integration(test):
         inputs = pickle.load(f)
     with open(exp_fname, 'rb') as f:
         expected = pickle.load(f)
-    game = main.new_game_2d(*inputs[0])
+    game = new_game(*inputs[0])
     for location, exp in zip(inputs[1], expected):
         num, g, render, renderx, ascii_, ascii_x = exp
         assert main.dig_2d(game, *location) == num
+        legacy = main.legacy_game(game)
         for key in g:
-            assert game[key] == g[key]
+            assert legacy[key] == g[key]
         assert main.render_2d_locations(game) == render
         assert main.render_2d_locations(game, xray=True) == renderx
         assert main.render_2d_board(game) == ascii_
@@ -143,7 +158,7 @@ def _do_test_2d_integration(test):
     else:
         for r in range(game['dimensions'][0]):
             for c in range(game['dimensions'][1]):
-                if game['hidden'][r][c]:
+                if legacy['hidden'][r][c]:
                     assert main.dig_2d(game, *location) == 0
                     assert game['state'] == 'ongoing'
 
@@ -153,6 +168,31 @@ def test_2d_integration():
         _do_test_2d_integration(testnum)
 
 
+def test_2d_integration_bitboard():
+    """ Same as test_2d_integration, on games kept in the bitboard form """
+    for testnum in range(9):
+        _do_test_2d_integration(testnum, main.new_bitboard_2d)
+
+
+def test_bitboard_random():
+    """ Bitboard games dig and render like flat games on random boards """
+    rng = random.Random(14)
+    for _ in range(50):
+        num_rows, num_cols = rng.randint(1, 40), rng.randint(1, 70)
+        cells = [(r, c) for r in range(num_rows) for c in range(num_cols)]
+        bombs = rng.sample(cells, int(len(cells) * rng.choice([0.02, 0.1, 0.25])))
+        flat = main.new_game_2d(num_rows, num_cols, bombs, legacy=False)
+        bitboard = main.new_bitboard_2d(num_rows, num_cols, bombs)
+        assert main.render_2d_locations(bitboard, True) == main.render_2d_locations(flat, True)
+        for row, col in rng.sample(cells, min(len(cells), 10)):
+            revealed = main.dig_2d(bitboard, row, col, delta=True)
+            expected = main.dig_2d(flat, row, col, delta=True)
+            assert sorted(revealed) == sorted(expected)
+            assert bitboard['state'] == flat['state']
+            assert main.victory_check(bitboard) == main.victory_check(flat)
+            assert main.render_2d_locations(bitboard) == main.render_2d_locations(flat)
+
+
 def test_newsmall6dgame():
     """ Testing new_game on a small 6-D board """
     exp_fname = os.path.join(TEST_DIRECTORY, 'test_outputs', 'testnd_newsmall6dgame.pickle')
@@ -179,6 +219,444 @@ def test_newlarge4dgame():
         assert result[i] == expected[i]
 
 
+def new_flat_game(dimensions, bombs):
+    return main.new_game_nd(dimensions, bombs, legacy=False)
+
+
+def new_lazy_game(dimensions, bombs):
+    return main.new_sparse_game(dimensions, bombs, lazy=True)
+
+
+def new_region_game(dimensions, bombs):
+    return main.new_game_nd(dimensions, bombs, legacy=False, regions=True)
+
+
+@pytest.mark.parametrize('new_game', [new_flat_game, main.new_sparse_game, new_lazy_game, new_region_game])
+def test_dig_delta(new_game):
+    """ Dig deltas list exactly the newly revealed squares """
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', 'testnd_integration2.pickle')
+    exp_fname = os.path.join(TEST_DIRECTORY, 'test_outputs', 'testnd_integration2.pickle')
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    with open(exp_fname, 'rb') as f:
+        expected = pickle.load(f)
+    g = new_game(inputs['dimensions'], inputs['bombs'])
+    before = main.render_nd(g)
+    for location, results in zip(inputs['digs'], expected):
+        squares_revealed, _, rendered, _ = results
+        revealed = main.dig_nd(g, location, delta=True)
+        assert len(revealed) == squares_revealed
+        assert len(set(coord for coord, _ in revealed)) == len(revealed)
+        for coord, value in revealed:
+            assert main.get_value(before, coord) == '_'
+            assert main.get_value(rendered, coord) == value
+        before = rendered
+
+
+def test_game_class():
+    """ Flat games are slotted Game objects that read like legacy dicts """
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', 'testnd_integration1.pickle')
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    g = main.new_game_nd(inputs['dimensions'], inputs['bombs'], legacy=False)
+    legacy = main.new_game_nd(inputs['dimensions'], inputs['bombs'])
+    assert isinstance(g, main.Game) and not hasattr(g, '__dict__')
+    for location in inputs['digs']:
+        assert main.dig_nd(g, location) == main.dig_nd(legacy, location)
+        for key in ('board', 'hidden', 'state'):
+            assert g[key] == legacy[key]
+    assert main.legacy_game(g) == legacy
+    assert sorted(g) == sorted(['cells', 'dimensions', 'hidden_safe', 'mask', 'state', 'strides', 'version'])
+    copy = pickle.loads(pickle.dumps(g))
+    assert copy == g and copy is not g
+    del copy['hidden_safe']
+    assert 'hidden_safe' not in copy and copy != g
+    with pytest.raises(KeyError):
+        copy['hidden_safe']
+    with pytest.raises(KeyError):
+        copy['bombs'] = {}
+
+
+@pytest.mark.parametrize('new_game', [main.new_game_nd, new_flat_game, main.new_sparse_game, new_lazy_game])
+@pytest.mark.parametrize('test', [1,2,3])
+def test_dig_many(test, new_game):
+    """ A batch of digs ends where the same digs made one by one end """
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', f'testnd_integration{test}.pickle')
+    exp_fname = os.path.join(TEST_DIRECTORY, 'test_outputs', f'testnd_integration{test}.pickle')
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    with open(exp_fname, 'rb') as f:
+        expected = pickle.load(f)
+    g = new_game(inputs['dimensions'], inputs['bombs'])
+    revealed = main.dig_many(g, inputs['digs'], delta=True)
+    _, game, rendered, _ = expected[-1]
+    assert len(revealed) == sum(results[0] for results in expected)
+    assert len(set(coord for coord, _ in revealed)) == len(revealed)
+    assert g['state'] == game['state']
+    assert main.render_nd(g) == rendered
+    assert main.dig_many(g, inputs['digs']) == 0
+
+
+@pytest.mark.parametrize('new_game', [new_flat_game, main.new_sparse_game, new_lazy_game, main.new_bitboard_2d])
+def test_chord(new_game):
+    """ Chords dig the unflagged neighbors of satisfied numbers only """
+    rng = random.Random(20)
+    num_rows, num_cols = 12, 15
+    cells = [(r, c) for r in range(num_rows) for c in range(num_cols)]
+    bombs = rng.sample(cells, 30)
+    if new_game is main.new_bitboard_2d:
+        g = new_game(num_rows, num_cols, bombs)
+    else:
+        g = new_game((num_rows, num_cols), bombs)
+    safe = [cell for cell in cells if cell not in bombs]
+    main.dig_nd(g, safe[0])
+    for _ in range(40):
+        if g['state'] != 'ongoing':
+            break
+        shown = main.render_2d_locations(g)
+        numbered = [(r, c) for r, c in cells if shown[r][c] not in '_ .']
+        r, c = rng.choice(numbered)
+        around = [(i, j) for i in range(max(r - 1, 0), min(r + 2, num_rows))
+                  for j in range(max(c - 1, 0), min(c + 2, num_cols))]
+        hidden = [cell for cell in around if shown[cell[0]][cell[1]] == '_']
+        if rng.random() < 0.2:
+            flagged = hidden[:int(shown[r][c])]
+        else:
+            flagged = [cell for cell in hidden if cell in bombs]
+        before = g['version']
+        revealed = main.chord_nd(g, (r, c), flagged, delta=True)
+        if len(flagged) != int(shown[r][c]):
+            assert revealed == [] and g['version'] == before
+            continue
+        targets = [cell for cell in hidden if cell not in flagged]
+        dug = {coord for coord, _ in revealed}
+        assert dug >= set(targets) - set(bombs) or g['state'] == 'defeat'
+        assert not dug & set(flagged)
+
+
+def new_bitboard_game(dimensions, bombs):
+    return main.new_bitboard_2d(*dimensions, bombs)
+
+
+@pytest.mark.parametrize('new_game', [main.new_game_nd, new_flat_game, main.new_sparse_game,
+                                      new_lazy_game, new_region_game, new_bitboard_game])
+def test_flags(new_game):
+    """ Flagged squares stay hidden through digs, openings and chords """
+    bombs = [(0, 0), (3, 5)]
+    g = new_game((4, 6), bombs)
+    assert main.flag_nd(g, (0, 0)) and main.flag_nd(g, (2, 2)) and main.flag_nd(g, (1, 3))
+    assert main.flag_nd(g, (1, 3), False) and not main.flag_nd(g, (1, 3), False)
+    assert g['flag_count'] == 2
+
+    assert main.dig_nd(g, (2, 2)) == 0
+    revealed = main.dig_nd(g, (0, 5), delta=True)
+    assert {coord for coord, _ in revealed}.isdisjoint({(0, 0), (2, 2)})
+    assert main.render_nd(g) == [['F', '1', ' ', ' ', ' ', ' '],
+                                 ['1', '1', ' ', ' ', ' ', ' '],
+                                 [' ', ' ', 'F', ' ', '1', '1'],
+                                 [' ', ' ', ' ', ' ', '1', '_']]
+    assert main.render_nd_board(g, True).count('F') == 0
+    assert main.legacy_game(g)['hidden'][2][2] and not main.flag_nd(g, (1, 1))
+    assert list(main.render_rows(g)) == main.render_nd(g)
+    assert main.render_slice(g, (0, 0), 1, 0)[2] == [' ', ' ', 'F', ' ']
+
+    assert main.flag_nd(g, (2, 2), False) and main.flag_nd(g, (3, 5))
+    assert main.dig_nd(g, (2, 2)) == 1
+    assert g['state'] == 'victory' and g['flag_count'] == 2
+    assert not main.flag_nd(g, (0, 0), False)
+
+    g = new_game((2, 3), [(0, 0)])
+    assert main.dig_nd(g, (0, 1)) == 1
+    assert main.chord_nd(g, (0, 1)) == 0
+    main.flag_nd(g, (0, 0))
+    revealed = main.chord_nd(g, (0, 1), delta=True)
+    assert sorted(coord for coord, _ in revealed) == [(0, 2), (1, 0), (1, 1), (1, 2)]
+    assert g['state'] == 'victory'
+
+
+def test_neighbor_tables():
+    """ Cached neighbor tables agree with neighbors() on every cell """
+    dimensions = (3, 1, 4, 2)
+    strides = main.strides_of(dimensions)
+    for coordinates in main.all_possible_coordinates(dimensions):
+        index = main.flat_index(coordinates, strides)
+        expected = [main.flat_index(n, strides)
+                    for n in main.neighbors(coordinates, dimensions)]
+        assert main.neighbor_indices(index, dimensions, strides) == expected
+
+
+def test_large_opening():
+    """ Flood fills do not depend on the recursion limit """
+    size = 10 * sys.getrecursionlimit()
+    for legacy in (False, True):
+        g = main.new_game_2d(size, 3, [(size - 1, 2)], legacy)
+        assert main.dig_2d(g, 0, 0) == size * 3 - 1
+        assert g['state'] == 'victory'
+    g = main.new_game_nd((size, 3), [(size - 1, 2)], legacy=False, regions=True)
+    assert main.dig_2d(g, 0, 0) == size * 3 - 1
+    assert g['state'] == 'victory'
+    g = main.new_bitboard_2d(size, 3, [(size - 1, 2)])
+    assert main.dig_2d(g, 0, 0) == size * 3 - 1
+    assert g['state'] == 'victory'
+
+
+@pytest.mark.parametrize('dimensions', [(1,), (7,), (5, 1, 4), (3, 3, 3, 3, 3, 3), (4, 6, 2, 3)])
+@pytest.mark.parametrize('density', [0.05, 0.5])
+def test_box_sum_counts(dimensions, density):
+    """ Both ways of counting neighboring bombs build the same board """
+    rng = random.Random(6101)
+    strides = main.strides_of(dimensions)
+    cells = list(main.all_possible_coordinates(dimensions))
+    bombs = [rng.choice(cells) for _ in range(int(len(cells) * density) + 1)]
+    expected = main.scatter_counts(dimensions, strides, bombs)
+    assert main.box_sum_counts(dimensions, strides, bombs) == expected
+    assert main.bomb_counts(dimensions, strides, bombs) == expected
+
+
+def test_numpy_backend_doctests():
+    results = doctest.testmod(numpy_backend, optionflags=TESTDOC_FLAGS, report=False)
+    num_failed, num_run = results
+    assert num_failed == 0 and num_run > 0
+
+
+@pytest.mark.parametrize('test', [1,2,3])
+def test_numpy_backend(test):
+    """ The NumPy backend (or its fallback) agrees with main """
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', f'testnd_integration{test}.pickle')
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    expected = main.new_game_nd(inputs['dimensions'], inputs['bombs'], legacy=False)
+    g = numpy_backend.new_game_nd(inputs['dimensions'], inputs['bombs'], legacy=False)
+    assert g == expected
+    for location in inputs['digs']:
+        main.dig_nd(g, location)
+        for xray in (False, True):
+            assert numpy_backend.render_nd(g, xray) == main.render_nd(g, xray)
+        legacy = main.legacy_game(g)
+        assert numpy_backend.victory_check(legacy) == main.victory_check(g)
+        assert numpy_backend.hidden_safe_cells(legacy) == g['hidden_safe']
+
+
+@pytest.mark.parametrize('new_game', [new_flat_game, main.new_sparse_game, new_lazy_game, new_region_game])
+def test_render_slice(new_game):
+    """ Slices of a board match the whole-board render """
+    dimensions = (3, 4, 2, 5)
+    rng = random.Random(6101)
+    bombs = [tuple(rng.randrange(d) for d in dimensions) for _ in range(20)]
+    g = new_game(dimensions, bombs)
+    main.dig_nd(g, (0, 0, 0, 0))
+    for xray in (False, True):
+        full = main.render_nd(g, xray)
+        corner = (1, 2, 1, 3)
+        for row_axis in range(len(dimensions)):
+            for col_axis in range(len(dimensions)):
+                rows = 1 if row_axis == col_axis else dimensions[row_axis]
+                expected = []
+                for row in range(rows):
+                    expected.append([])
+                    for col in range(dimensions[col_axis]):
+                        coord = list(corner)
+                        coord[row_axis] = row
+                        coord[col_axis] = col
+                        expected[-1].append(main.get_value(full, coord))
+                result = main.render_slice(g, corner, row_axis, col_axis, xray)
+                assert result == expected
+                window = ((1, 3), (1, 10))
+                result = main.render_slice(g, corner, row_axis, col_axis, xray, window)
+                assert result == [row[1:] for row in expected[1:3]]
+
+
+def rows_of(rendered):
+    if not rendered or isinstance(rendered[0], str):
+        return [rendered]
+    return [row for inner in rendered for row in rows_of(inner)]
+
+
+@pytest.mark.parametrize('new_game', [main.new_game_nd, new_flat_game, main.new_sparse_game, new_lazy_game])
+def test_render_rows(new_game):
+    """ Streamed rows are the rows of render_nd, in order """
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', 'testnd_integration3.pickle')
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    g = new_game(inputs['dimensions'], inputs['bombs'])
+    for location in inputs['digs'][:3]:
+        main.dig_nd(g, location)
+        for xray in (False, True):
+            rows = main.render_rows(g, xray)
+            assert not isinstance(rows, list)
+            assert list(rows) == rows_of(main.render_nd(g, xray))
+
+    g = main.new_bitboard_2d(5, 7, [(0, 0), (3, 4), (4, 6)])
+    main.dig_2d(g, 0, 6)
+    for xray in (False, True):
+        assert list(main.render_rows(g, xray)) == main.render_2d_locations(g, xray)
+        assert list(main.render_2d_lines(g, xray)) == main.render_2d_board(g, xray).split('\n')
+
+
+def test_ascii_export():
+    """ N-d boards are exported as ASCII slices, to strings or files """
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', 'testnd_integration2.pickle')
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    g = main.new_game_nd(inputs['dimensions'], inputs['bombs'], legacy=False)
+    main.dig_nd(g, inputs['digs'][0])
+    dimensions = inputs['dimensions']
+    for xray in (False, True):
+        text = main.render_nd_board(g, xray)
+        out = io.StringIO()
+        main.write_board(g, out, xray)
+        assert out.getvalue() == text
+
+        rows = rows_of(main.render_nd(g, xray))
+        blocks = text.split('\n\n')
+        assert len(blocks) == len(rows) // dimensions[-2]
+        for number, block in enumerate(blocks):
+            header, *lines = block.split('\n')
+            corner = main.flat_coordinates(number, dimensions[:-2])
+            assert header == str(tuple(corner) + (':', ':')).replace("':'", ':')
+            slice_rows = rows[number * dimensions[-2]:(number + 1) * dimensions[-2]]
+            assert lines == [''.join(row) for row in slice_rows]
+
+    g = main.new_game_2d(30, 40, [(3, 4), (20, 9)])
+    main.dig_2d(g, 29, 0)
+    out = io.StringIO()
+    main.write_board(g, out)
+    assert out.getvalue() == main.render_2d_board(g) == main.render_nd_board(g)
+
+
+def test_game_store():
+    """ Games are evicted once idle past the TTL or past max_games """
+    results = doctest.testmod(game_store, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+    now = [0]
+    store = game_store.GameStore(max_games=3, ttl=10, clock=lambda: now[0])
+    ids = [store.add({'id': i}) for i in range(3)]
+    now[0] = 8
+    with store.locked(ids[0]) as game:
+        assert game == {'id': 0}
+    now[0] = 15
+    store.add({'id': 3})
+    assert ids[0] in store
+    assert ids[1] not in store and ids[2] not in store
+    with pytest.raises(KeyError):
+        with store.locked(ids[1]):
+            pass
+
+    with store.locked(ids[0]) as game:
+        for i in range(4, 7):
+            store.add({'id': i})
+        assert ids[0] in store and len(store) == 3
+    store.add({'id': 7})
+    assert ids[0] not in store and len(store) == 3
+
+
+def test_async_server():
+    """ A slow request does not hold up other clients; a failing one gets a 500 """
+    release = threading.Event()
+
+    def application(environ, start_response):
+        if environ['PATH_INFO'] == '/slow':
+            release.wait(5)
+        if environ['PATH_INFO'] == '/broken':
+            raise RuntimeError('broken handler')
+        body = environ['wsgi.input'].read() or environ['PATH_INFO'].encode()
+        start_response('200 OK', [('Content-type', 'text/plain')])
+        return [body]
+
+    async def request(port, path, body=b''):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'POST ' + path + b' HTTP/1.1\r\nConnection: close\r\n'
+                     b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def run_client():
+        server = await async_server.start_server(application, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            slow = asyncio.ensure_future(request(port, b'/slow'))
+            fast = await asyncio.wait_for(request(port, b'/fast', b'{"a": 1}'), 2)
+            assert not slow.done()
+            release.set()
+            broken = await asyncio.wait_for(request(port, b'/broken'), 2)
+            return fast, await slow, broken
+
+    fast, slow, broken = asyncio.run(run_client())
+    assert fast.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert fast.endswith(b'\r\n\r\n{"a": 1}')
+    assert slow.endswith(b'\r\n\r\n/slow')
+    assert broken.startswith(b'HTTP/1.1 500 INTERNAL SERVER ERROR\r\n')
+
+
+def test_static_cache(tmp_path):
+    """ Static assets are served from memory, gzipped and revalidated """
+    results = doctest.testmod(static_cache, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+    (tmp_path / 'fonts').mkdir()
+    (tmp_path / 'fonts' / 'a.js').write_text('var x = 1;\n' * 200)
+    assets = static_cache.StaticAssets(str(tmp_path))
+    (tmp_path / 'fonts' / 'a.js').write_text('changed on disk')
+    assert assets.respond('b.js', {}) is None
+
+    status, headers, body = assets.respond('fonts/a.js', {})
+    headers = dict(headers)
+    assert status == '200 OK'
+    assert body == b'var x = 1;\n' * 200
+    assert 'Content-Encoding' not in headers
+
+    status, gz_headers, gz_body = assets.respond('fonts/a.js', {'HTTP_ACCEPT_ENCODING': 'gzip'})
+    gz_headers = dict(gz_headers)
+    assert gz_headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gz_body) == body
+    assert gz_headers['ETag'] != headers['ETag']
+
+    status, _, body = assets.respond('fonts/a.js', {'HTTP_IF_NONE_MATCH': headers['ETag']})
+    assert status == '304 NOT MODIFIED' and body == b''
+    status, _, _ = assets.respond('fonts/a.js', {'HTTP_IF_NONE_MATCH': '"other"'})
+    assert status == '200 OK'
+
+
+def test_render_cache_doctests():
+    """ Checking to see if all render_cache doctests run successfully """
+    results = doctest.testmod(render_cache, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+
+@pytest.mark.parametrize('new_game', [new_flat_game, main.new_sparse_game, new_lazy_game])
+def test_render_cache(new_game):
+    """ Renders are cached per game version and revalidated by ETag """
+    g = new_game((2, 4), [(0, 0), (1, 0), (1, 1)])
+    assert g['version'] == 0
+    cache = render_cache.RenderCache(max_entries=2)
+    calls = []
+
+    def render():
+        calls.append(g['version'])
+        return main.render_nd(g)
+
+    status, headers, body = cache.respond(('g', g['version'], False), {}, render)
+    assert status == '200 OK' and body == b'[["_", "_", "_", "_"], ["_", "_", "_", "_"]]'
+    etag = dict(headers)['ETag']
+    assert cache.respond(('g', g['version'], False), {}, render)[2] == body
+    status, _, body = cache.respond(('g', g['version'], False), {'HTTP_IF_NONE_MATCH': etag}, render)
+    assert status == '304 NOT MODIFIED' and body == b''
+    assert calls == [0]
+
+    assert main.dig_nd(g, (0, 0)) == 1
+    assert main.dig_nd(g, (0, 0)) == 0
+    assert g['version'] == 1
+    status, headers, body = cache.respond(('g', g['version'], False), {'HTTP_IF_NONE_MATCH': etag}, render)
+    assert status == '200 OK' and body == b'[[".", "_", "_", "_"], ["_", "_", "_", "_"]]'
+    assert dict(headers)['ETag'] != etag
+    assert calls == [0, 1]
+
+    cache.respond(('g', g['version'], True), {}, render)
+    assert len(cache) == 2 and cache.lookup(('g', 0, False)) is None
+
+
 def flip(board):
     if type(board[0]) == bool:
         return [not b for b in board]
@@ -204,6 +682,328 @@ def test_nd_integration(test):
         assert main.render_nd(g, True) == rendered_xray
 
 
+@pytest.mark.parametrize('new_game', [new_flat_game, main.new_sparse_game, new_lazy_game, new_region_game])
+@pytest.mark.parametrize('test', [1,2,3])
+def test_nd_integration_flat(test, new_game):
+    """ Same as test_nd_integration, on games kept in the flat and sparse forms """
+    exp_fname = os.path.join(TEST_DIRECTORY, 'test_outputs', f'testnd_integration{test}.pickle')
+    inp_fname = os.path.join(TEST_DIRECTORY, 'test_inputs', f'testnd_integration{test}.pickle')
+    with open(exp_fname, 'rb') as f:
+        expected = pickle.load(f)
+    with open(inp_fname, 'rb') as f:
+        inputs = pickle.load(f)
+    g = new_game(inputs['dimensions'], inputs['bombs'])
+    for location, results in zip(inputs['digs'], expected):
+        squares_revealed, game, rendered, rendered_xray = results
+        res = main.dig_nd(g, location)
+        assert res == squares_revealed
+        legacy = main.legacy_game(g)
+        for i in ('board', 'hidden', 'state'):
+            assert legacy[i] == game[i]
+        flat = main.flat_game(g)
+        assert g['hidden_safe'] == sum(
+            1 for value, hidden in zip(flat['cells'], flat['mask'])
+            if hidden and value != main.BOMB)
+        assert main.render_nd(g) == rendered
+        assert main.render_nd(g, True) == rendered_xray
+
+
+def test_move_log_doctests():
+    """ Checking to see if all move_log doctests run successfully """
+    results = doctest.testmod(move_log, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+
+@pytest.mark.parametrize('start', [
+    ('new_game_nd', (5, 4, 3), {'legacy': False}),
+    ('new_game_nd', (5, 4, 3), {}),
+    ('new_sparse_game', (5, 4, 3), {'lazy': True}),
+    ('new_bitboard_2d', (9, 7), {}),
+])
+def test_move_log(start):
+    """ Move logs restore every earlier position, undo and survive a crash """
+    constructor, dimensions, kwargs = start
+    rng = random.Random(22)
+    cells = list(main.all_possible_coordinates(dimensions))
+    bombs = rng.sample(cells, 6)
+    args = dimensions if constructor == 'new_bitboard_2d' else (dimensions,)
+    stream = io.StringIO()
+    log = move_log.MoveLog(constructor, *args, bombs, snapshot_every=3,
+                           stream=stream, **kwargs)
+    renders = [main.render_nd(log.game)]
+    while log.game['state'] == 'ongoing':
+        cell = rng.choice(cells)
+        kind = rng.choice(['dig', 'flag', 'flag', 'chord', 'many'])
+        if kind == 'flag':
+            log.flag(cell, rng.random() < 0.7)
+        elif kind == 'chord':
+            log.chord(cell)
+        elif kind == 'many':
+            log.dig_many([c for c in rng.sample(cells, 2) if c not in bombs])
+        elif cell not in bombs or len(log) > 40:
+            log.dig(cell)
+        renders.append(main.render_nd(log.game))
+    assert len(log.snapshots) == len(log) // 3
+
+    for moves, render in enumerate(renders):
+        assert main.render_nd(log.restore(moves)) == render
+    with pytest.raises(IndexError):
+        log.restore(len(log) + 1)
+
+    version = log.game.get('version', 0)
+    log.undo(2)
+    assert len(log) == len(renders) - 3
+    assert main.render_nd(log.game) == renders[-3]
+    assert log.game['state'] == 'ongoing'
+    assert log.game.get('version', 1) > version
+    log.dig(next(c for c in cells if c not in bombs))
+
+    lines = stream.getvalue().splitlines(True) + ['{"move": ["dig", [0,']
+    recovered = move_log.MoveLog.load(lines)
+    assert recovered.moves == log.moves
+    assert main.render_nd(recovered.game) == main.render_nd(log.game)
+    assert recovered.game.get('version') == log.game.get('version')
+    assert (main.render_nd(recovered.restore(len(log) - 1))
+            == main.render_nd(log.restore(len(log) - 1)))
+
+
+def test_game_file(tmp_path):
+    """ Games round-trip through the binary format and render from the map """
+    results = doctest.testmod(game_file, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+    path = str(tmp_path / 'game.bin')
+    rng = random.Random(23)
+    for dimensions, new_game in [([4, 6], main.new_game_nd),
+                                 ((6, 5, 4), new_flat_game),
+                                 ((3,) * 6, new_flat_game),
+                                 ((6, 5, 4), main.new_sparse_game),
+                                 ((9, 11), new_bitboard_game)]:
+        cells = list(main.all_possible_coordinates(dimensions))
+        g = new_game(dimensions, rng.sample(cells, len(cells) // 5))
+        for cell in rng.sample(cells, 8):
+            if rng.random() < 0.5:
+                main.flag_nd(g, cell)
+            elif g['state'] == 'ongoing':
+                main.dig_nd(g, cell)
+        game_file.save_game(g, path)
+
+        loaded = game_file.load_game(path)
+        if 'board' in g:
+            assert loaded == g and loaded['dimensions'] == [4, 6]
+        else:
+            expected = main.flat_game(g)
+            expected['version'] = g['version']
+            assert loaded == expected
+        with game_file.GameFile(path) as f:
+            assert list(main.render_rows(f.game)) == list(main.render_rows(g))
+            assert (f.render_slice(cells[-1], 0, 1, True, ((1, 3), (0, 2)))
+                    == main.render_slice(g, cells[-1], 0, 1, True, ((1, 3), (0, 2))))
+        assert game_file.load_game(path) == loaded
+
+    with open(path, 'r+b') as f:
+        f.write(b'XXXX')
+    with pytest.raises(ValueError):
+        game_file.GameFile(path)
+
+
+def test_sqlite_store(tmp_path):
+    """ Games written to SQLite in batches are rehydrated after a restart """
+    results = doctest.testmod(sqlite_store, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+    filename = str(tmp_path / 'games.sqlite3')
+    now = [0.0]
+    store = sqlite_store.SQLiteGameStore(filename, max_games=10, clock=lambda: now[0],
+                                         batch_size=50, flush_interval=5)
+    rng = random.Random(24)
+    renders = {}
+    for _ in range(40):
+        log = move_log.MoveLog('new_game_nd', (6, 7), rng.sample(
+            list(main.all_possible_coordinates((6, 7))), 5), legacy=False,
+            snapshot_every=4)
+        game_id = store.add(log)
+        for _ in range(rng.randrange(12)):
+            with store.locked(game_id) as log:
+                if log.game['state'] != 'ongoing':
+                    break
+                cell = (rng.randrange(6), rng.randrange(7))
+                if rng.random() < 0.3:
+                    log.flag(cell)
+                else:
+                    log.dig(cell)
+        renders[game_id] = main.render_nd(log.game)
+    assert len(store) == 10 and 0 < len(store._pending) < 50
+
+    with store.locked(game_id) as log:
+        log.undo()
+    renders[game_id] = main.render_nd(log.game)
+    now[0] += 5
+    with store.locked(game_id) as log:
+        log.flag((0, 0), False)
+    assert store._pending == []
+    store.remove(next(iter(renders)))
+    del renders[next(iter(renders))]
+    store.close()
+
+    store = sqlite_store.SQLiteGameStore(filename, max_games=10)
+    assert len(store) == 0
+    for game_id, render in renders.items():
+        assert game_id in store
+        with store.locked(game_id) as log:
+            assert main.render_nd(log.game) == render
+    assert len(store) == 10 and 'missing' not in store
+    with pytest.raises(KeyError):
+        with store.locked('missing'):
+            pass
+    store.close()
+
+
+def test_bench(tmp_path, capsys):
+    """ The benchmark harness writes JSON results and flags regressions """
+    results = doctest.testmod(bench, optionflags=TESTDOC_FLAGS, report=False)
+    assert results.failed == 0 and results.attempted > 0
+
+    output = str(tmp_path / 'results.json')
+    args = ['--dimensions', '2', '4', '--volumes', '200', '--densities', '0.05',
+            '--repeats', '1', '-o', output]
+    assert bench.main_cli(args) == 0
+    with open(output) as f:
+        report = json.load(f)
+    cases = {(r['operation'], r['dimensions']) for r in report['results']}
+    assert cases == {(operation, ndim) for operation in bench.OPERATIONS
+                     for ndim in (2, 4)}
+    assert all(r['seconds'] > 0 and r['peak_bytes'] >= 0 for r in report['results'])
+    assert report['results'][0]['shape'] == [14, 14]
+
+    for result in report['results']:
+        result['seconds'] /= 1000
+    baseline = str(tmp_path / 'baseline.json')
+    with open(baseline, 'w') as f:
+        json.dump(report, f)
+    assert bench.main_cli(args + ['--baseline', baseline]) == 1
+    assert 'REGRESSION' in capsys.readouterr().err
+    assert bench.main_cli(args + ['--baseline', output, '--threshold', '1e6']) == 0
+
+
+@pytest.mark.parametrize('new_game', [main.new_game_nd, new_flat_game, new_region_game])
+def test_out_of_range(new_game):
+    """ Coordinates off the board raise IndexError and leave the game alone """
+    g = new_game((4, 4), [(1, 2)])
+    for coordinates in [(0, 6), (4, 0), (-1, 0), (0,), (0, 0, 0)]:
+        for move in (main.dig_nd, main.flag_nd, main.chord_nd):
+            with pytest.raises(IndexError):
+                move(g, coordinates)
+        with pytest.raises(IndexError):
+            main.dig_many(g, [coordinates])
+    with pytest.raises(IndexError):
+        main.render_slice(g, (0, 0, 1), 0, 1)
+    assert g['state'] == 'ongoing'
+    assert main.render_nd(g) == [['_'] * 4] * 4
+
+    version = g.get('version')
+    with pytest.raises(IndexError):
+        main.dig_many(g, [(3, 3), (0, 0), (9, 9)])
+    assert main.render_nd(g) == [['_'] * 4] * 4 and g.get('version') == version
+
+    log = move_log.MoveLog('new_game_nd', (4, 4), [(1, 2)], legacy=False)
+    with pytest.raises(IndexError):
+        log.dig_many([(0, 1), (9, 9)])
+    assert len(log) == 0 and main.render_nd(log.game) == main.render_nd(log.restore())
+
+
+@pytest.mark.parametrize('new_game', [main.new_sparse_game, new_lazy_game, new_bitboard_game])
+def test_out_of_range_sparse(new_game):
+    """ Sparse and bitboard games reject coordinates off the board too """
+    g = new_game((4, 4), [(0, 0)])
+    for coordinates in [(9, 9), (0, 4), (-1, 2), (1,)]:
+        with pytest.raises(IndexError):
+            main.dig_nd(g, coordinates)
+        with pytest.raises(IndexError):
+            main.reveal_square(g, coordinates)
+        with pytest.raises(IndexError):
+            main.flag_nd(g, coordinates)
+    assert g['hidden_safe'] == 15
+    assert main.dig_nd(g, (3, 3)) == 15
+    assert g['state'] == 'victory'
+
+
+@pytest.mark.parametrize('new_game', [main.new_game_nd, new_flat_game, main.new_sparse_game,
+                                      new_lazy_game, new_region_game, new_bitboard_game])
+def test_flag_splits_opening(new_game):
+    """ A flag in the middle of an opening stops it from spreading past it """
+    g = new_game((1, 5), [])
+    assert main.flag_nd(g, (0, 3))
+    assert main.dig_nd(g, (0, 1)) == 3
+    assert main.render_nd(g) == [[' ', ' ', ' ', 'F', '_']]
+    assert g['state'] == 'ongoing'
+    assert main.dig_nd(g, (0, 4)) == 1
+    assert main.flag_nd(g, (0, 3), False) and main.dig_nd(g, (0, 3)) == 1
+    assert g['state'] == 'victory'
+
+    g = new_game((3, 5), [(0, 4)])
+    for row in range(3):
+        main.flag_nd(g, (row, 2))
+    assert main.dig_nd(g, (1, 0)) == 6
+    assert main.render_nd(g) == [[' ', ' ', 'F', '_', '_'],
+                                 [' ', ' ', 'F', '_', '_'],
+                                 [' ', ' ', 'F', '_', '_']]
+
+
+@pytest.mark.parametrize('new_game', [main.new_game_nd, new_flat_game, main.new_sparse_game,
+                                      new_lazy_game, new_region_game, new_bitboard_game])
+def test_duplicate_bombs(new_game):
+    """ A bomb listed more than once is counted every time it is listed """
+    g = new_game((3, 4), [(0, 0), (0, 0), (2, 3), (2, 3), (2, 3)])
+    assert main.render_nd(g, True) == [['.', '2', ' ', ' '],
+                                       ['2', '2', '3', '3'],
+                                       [' ', ' ', '3', '.']]
+    assert g.get('hidden_safe', 10) == 10
+    assert main.dig_nd(g, (0, 3)) == 6
+    assert main.render_nd(g) == [['_', '2', ' ', ' '],
+                                 ['_', '2', '3', '3'],
+                                 ['_', '_', '_', '_']]
+
+
+def test_sqlite_store_evict_locked(tmp_path):
+    """ A game is not evicted mid-move, so its persisted log stays whole """
+    filename = str(tmp_path / 'games.sqlite3')
+    store = sqlite_store.SQLiteGameStore(filename, max_games=1)
+    first = store.add(move_log.MoveLog('new_game_nd', (3, 3), [(0, 0)],
+                                       legacy=False, snapshot_every=2))
+    with store.locked(first) as log:
+        log.flag((2, 2))
+        store.add(move_log.MoveLog('new_game_nd', (2, 2), [], legacy=False))
+        store.rehydrate(first)
+        log.dig((1, 1))
+    with store.locked(first) as log:
+        log.dig((0, 2))
+        render = main.render_nd(log.game)
+    store.close()
+
+    store = sqlite_store.SQLiteGameStore(filename)
+    with store.locked(first) as log:
+        assert main.render_nd(log.game) == render
+        assert log.moves[-2:] == [('dig', (1, 1)), ('dig', (0, 2))]
+    store.close()
+
+
+def test_sqlite_store_idle_flush(tmp_path):
+    """ Queued lines are written within flush_interval with no further moves """
+    store = sqlite_store.SQLiteGameStore(str(tmp_path / 'games.sqlite3'),
+                                         flush_interval=0.05)
+    game_id = store.add(move_log.MoveLog('new_game_nd', (2, 2), [], legacy=False))
+    with store.locked(game_id) as log:
+        log.flag((0, 0))
+    for _ in range(100):
+        if not store._pending:
+            break
+        time.sleep(0.01)
+    assert store._pending == []
+    store.close()
+    assert not store._flusher.is_alive()
+
+
 if __name__ == "__main__":
     import sys
 
@@ -67,6 +67,7 @@ var board_state;
 var xray_state = false;
 var our_renderer = false;
 var board_mask;
+var board_render;
 var board_params = {0: 5, 1: 10, 2: 15}
 
 var canvas = null;
@@ -153,6 +154,8 @@ function handle_renderer_button(){
 }
 
 function render(result){
+  board_render = result;
+
   // calculate unit for lattice cell
 
   context.clearRect(0, 0, width, height);
@@ -211,18 +214,17 @@ function render(result){
 }
 
 function render_result_dig(result) {
-  var args = {
-    "xray": xray_state,
-    "num_rows": board_params[board_size],
-    "num_cols": board_params[board_size],
-      "our_renderer": our_renderer,
-  };
-  invoke_rpc("/ui_render_2d", args, 0, render);
+  // result[2] holds the [[row, col], value] pairs of the revealed squares
+  result[2].forEach(function(square) {
+    board_render[square[0][0]][square[0][1]] = square[1];
+  });
+  render(board_render);
 
   if (result[0] == "victory") {
     document.getElementById('gameStateText').innerHTML = "YOU WIN - YOU CLEARED THE BOARD!";
     game_over = true;
     var args = {
+      "game": board_state,
       "xray": true,
     "num_rows": board_params[board_size],
     "num_cols": board_params[board_size],
@@ -234,6 +236,7 @@ function render_result_dig(result) {
     document.getElementById('gameStateText').innerHTML = "YOU LOSE - YOU DUG A BOMB!";
     game_over = true;
     var args = {
+      "game": board_state,
       "xray": true,
     "num_rows": board_params[board_size],
     "num_cols": board_params[board_size],
@@ -66,6 +66,7 @@ var dimensions;
 var xray_state;
 
 var render_board;
+var game_id;
 
 var canvas = null;
 var context = null;
@@ -116,7 +117,8 @@ function init_board() {
   var num_bombs = get_num_bombs();
   var bomb_list = new_random_game(num_bombs);
 
-  invoke_rpc("/ui_new_game_nd", get_args({bombs: bomb_list}), 0, function () {
+  invoke_rpc("/ui_new_game_nd", get_args({bombs: bomb_list}), 0, function (result) {
+    game_id = result;
     render_rpc();
   });
 }
@@ -298,7 +300,7 @@ function render_selected() {
     chosen_slice[i] = val;
   });
 
-  render(render_board);
+  render_rpc();
 }
 
 function signal_input_error(msg) {
@@ -348,16 +350,10 @@ function render(render_board) {
   }
 
   // color each square
-  // get_value
-
-  // using the recursive getter here
+  // render_board only holds the selected slice, indexed [row][col]
   for (var row = 0; row < board_rows; row++) {
     for (var col = 0; col < board_cols; col++) {
-      var coord = chosen_slice.slice();
-      coord[chosen_dim_y] = row;
-      coord[chosen_dim_x] = col;
-
-      var value = get_value(coord, render_board);
+      var value = render_board[row][col];
 
       if (value == '_') {
         square_style_fill(col, row);
@@ -403,22 +399,11 @@ function new_random_game(num_bombs) {
   return bomb_list
 }
 
-function get_value(coord, board){
-  var this_coord = coord[0];
-
-  // Base case
-  if (coord.length === 1){
-    return board[this_coord]
-  }
-
-  // Recursive case
-  return get_value(coord.slice(1), board[this_coord])
-}
-
 // ----------------------- RPC -----------------------------------------//
 
 function get_args(optional) {
   return {
+    "game": game_id,
     "xray": xray_state,
     "bombs": optional && optional.bombs,
     "dimensions": dimensions,
@@ -427,7 +412,10 @@ function get_args(optional) {
 }
 
 function render_rpc() {
-  invoke_rpc("/ui_render_nd", get_args(), 0, function(result) {
+  var args = get_args({coordinates: chosen_slice});
+  args.row_axis = chosen_dim_y;
+  args.col_axis = chosen_dim_x;
+  invoke_rpc("/ui_render_nd_slice", args, 0, function(result) {
     render_board = result;
     render(render_board);
   });
@@ -465,7 +453,23 @@ function dig_square(row, col) {
     }
     change_board_state(board_text, state);
 
-    render_rpc();
+    patch_render_board(result[2]);
+    render(render_board);
+  });
+}
+
+// update the drawn slice in place with the [coordinates, value] pairs of the
+// squares revealed by a dig, instead of fetching the slice again
+function patch_render_board(revealed) {
+  revealed.forEach(function(square) {
+    var coord = square[0];
+    for (var i = 0; i < coord.length; i++) {
+      if (i !== chosen_dim_x && i !== chosen_dim_y && coord[i] !== chosen_slice[i]) {
+        return;
+      }
+    }
+    var row = chosen_dim_x === chosen_dim_y ? 0 : coord[chosen_dim_y];
+    render_board[row][coord[chosen_dim_x]] = square[1];
   });
 }
 